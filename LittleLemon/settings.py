@@ -93,6 +93,74 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is fine for a single node. Point CACHE_URL at a shared redis
+# when running more than one node so all of them see the same menu version.
+
+if os.getenv("CACHE_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CACHE_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "littlelemon",
+        }
+    }
+
+# seconds a cached menu page lives. Writes invalidate it right away anyway.
+MENU_CACHE_TIMEOUT = int(os.getenv("MENU_CACHE_TIMEOUT", 60 * 60))
+
+
+# most rows a single list page may return, whatever perpage a client asks for
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+
+
+# most items one POST to /api/menu-items/bulk/ may carry
+MENU_BULK_MAX_ITEMS = int(os.getenv("MENU_BULK_MAX_ITEMS", 10_000))
+
+# rows fetched per round trip while streaming /api/menu-items/export/
+MENU_EXPORT_CHUNK_SIZE = int(os.getenv("MENU_EXPORT_CHUNK_SIZE", 2000))
+
+# queue checkouts for the process_checkout_jobs worker instead of placing
+# the order in the request (?async=true/false on a request overrides it)
+CHECKOUT_ASYNC = os.getenv("CHECKOUT_ASYNC", "False").lower() in ("true", "1", "yes")
+
+# where carts live: the CartItem table (default) or
+# "LittlelemonAPI.cart_store.CacheCartBackend" to keep them in the (shared,
+# see CACHE_URL) cache and write them to the table behind, see cart_store.py
+CART_BACKEND = os.getenv(
+    "CART_BACKEND", "LittlelemonAPI.cart_store.DatabaseCartBackend"
+)
+# seconds a cart that has been written to the table stays cached
+CART_CACHE_TIMEOUT = int(os.getenv("CART_CACHE_TIMEOUT", 24 * 60 * 60))
+# most changes one POST to /api/cart-items/batch/ may carry
+CART_BATCH_MAX_OPERATIONS = int(os.getenv("CART_BATCH_MAX_OPERATIONS", 100))
+
+# seconds a stored response is replayed for retries with the same
+# Idempotency-Key header, see LittlelemonAPI/idempotency.py
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+# seconds a key stays claimed by a request that hasn't answered yet; after
+# that (its worker died) a retry may run it again. Keep it above the
+# longest a request can take
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+# seconds a user's group names stay cached between requests (0: load them
+# once per request only), see LittlelemonAPI/roles.py
+ROLE_CACHE_TIMEOUT = int(os.getenv("ROLE_CACHE_TIMEOUT", 0))
+
+# seconds a sales report stays cached per date range, see LittlelemonAPI/reports.py
+REPORT_CACHE_TIMEOUT = int(os.getenv("REPORT_CACHE_TIMEOUT", 5 * 60))
+
+# sales tax for categories that don't set their own rate (0.10 == 10%)
+DEFAULT_TAX_RATE = os.getenv("DEFAULT_TAX_RATE", "0.10")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,209 @@
+"""
+Read-through cache for the menu endpoints.
+
+Cached pages are keyed on the normalized query params plus a global
+"menu version". Any write to a MenuItem or Category bumps the version
+(see signals.py), so every previously cached page is simply never
+looked up again and ages out of the cache on its own.
+
+Stock is the exception: checkout only moves inventory, and dropping
+every page on each order would leave the cache nearly always cold. The
+inventory of each item is cached on its own (again under the menu
+version) and laid over the pages as they are served; checkout forgets
+just the items it took off stock, and moves the "stock version" that
+the menu list ETag is built from.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from LittlelemonAPI.models import MenuItem
+
+MENU_VERSION_KEY = "littlelemon:menu:version"
+MENU_PAGE_KEY_PREFIX = "littlelemon:menu:page"
+MENU_HITS_KEY = "littlelemon:menu:hits"
+MENU_MISSES_KEY = "littlelemon:menu:misses"
+MENU_STOCK_KEY_PREFIX = "littlelemon:menu:stock"
+MENU_STOCK_VERSION_KEY = "littlelemon:menu:stockversion"
+
+# what an untracked (NULL) inventory is cached as; a cached None reads as a miss
+UNTRACKED = -1
+
+# query params that change the body of a menu_items page
+MENU_LIST_PARAMS = (
+    "category",
+    "to_price",
+    "search",
+    "ordering",
+    "page",
+    "perpage",
+    "cursor",
+)
+
+
+def _get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key: str) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # key missing: starting a fresh time based version is a bump too.
+        cache.add(key, time.time_ns(), timeout=None)
+        return _get_version(key)
+
+
+def get_menu_version() -> int:
+    """
+    Return the current menu version, creating it if it was never set
+    (or was evicted). The starting value is time based so a counter that
+    restarts can't line up with versions that are still cached.
+    """
+    return _get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version() -> int:
+    """
+    Invalidate every cached menu page by moving to a new version.
+    """
+    return _bump_version(MENU_VERSION_KEY)
+
+
+def get_stock_version() -> int:
+    """
+    Moves whenever checkout takes items off stock, which leaves the menu
+    version (and the cached pages) alone. With the menu version it is
+    enough to validate a menu list ETag without building the page.
+    """
+    return _get_version(MENU_STOCK_VERSION_KEY)
+
+
+def normalize_menu_params(query_params, names=MENU_LIST_PARAMS) -> str:
+    """
+    Turn the request query params into a stable string, ignoring params
+    that don't affect the response and the order they were sent in.
+    """
+    parts = []
+    for name in sorted(names):
+        value = query_params.get(name)
+        if value is not None:
+            parts.append(f"{name}={value}")
+    return "&".join(parts)
+
+
+def menu_page_key(normalized_params: str, version: int | None = None) -> str:
+    if version is None:
+        version = get_menu_version()
+    digest = hashlib.sha1(normalized_params.encode()).hexdigest()
+    return f"{MENU_PAGE_KEY_PREFIX}:{version}:{digest}"
+
+
+def _count(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_or_set_menu_page(
+    normalized_params: str, build, version: int | None = None
+):
+    """
+    Return the cached body for these params, calling `build()` to
+    produce (and store) it on a miss.
+    """
+    key = menu_page_key(normalized_params, version)
+    data = cache.get(key)
+    if data is not None:
+        _count(MENU_HITS_KEY)
+        return data
+    _count(MENU_MISSES_KEY)
+    data = build()
+    cache.set(key, data, timeout=settings.MENU_CACHE_TIMEOUT)
+    return data
+
+
+def _stock_key(version: int, menuitem_id) -> str:
+    return f"{MENU_STOCK_KEY_PREFIX}:{version}:{menuitem_id}"
+
+
+def get_stock(menuitem_ids, version: int | None = None) -> dict:
+    """
+    {menuitem_id: inventory} for `menuitem_ids`, from the cache, with
+    one query for the items that aren't cached. Items that no longer
+    exist are left out.
+    """
+    if version is None:
+        version = get_menu_version()
+    keys = {
+        _stock_key(version, menuitem_id): menuitem_id for menuitem_id in menuitem_ids
+    }
+    stock = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    missing = [menuitem_id for menuitem_id in keys.values() if menuitem_id not in stock]
+    if missing:
+        fresh = {
+            menuitem_id: UNTRACKED if inventory is None else inventory
+            for menuitem_id, inventory in MenuItem.objects.filter(
+                id__in=missing
+            ).values_list("id", "inventory")
+        }
+        cache.set_many(
+            {
+                _stock_key(version, menuitem_id): value
+                for menuitem_id, value in fresh.items()
+            },
+            timeout=settings.MENU_CACHE_TIMEOUT,
+        )
+        stock.update(fresh)
+    return {
+        menuitem_id: None if value == UNTRACKED else value
+        for menuitem_id, value in stock.items()
+    }
+
+
+def with_live_stock(rows, version: int | None = None) -> list:
+    """
+    Copies of the serialized menu item `rows` with their current
+    inventory.
+    """
+    stock = get_stock([row["id"] for row in rows], version)
+    return [
+        {**row, "inventory": stock.get(row["id"], row["inventory"])} for row in rows
+    ]
+
+
+def forget_stock(menuitem_ids) -> None:
+    """
+    Drop the cached inventory of `menuitem_ids` after a change that
+    didn't go through the menu signals (which move to a new version).
+    """
+    version = get_menu_version()
+    cache.delete_many(
+        [_stock_key(version, menuitem_id) for menuitem_id in menuitem_ids]
+    )
+    _bump_version(MENU_STOCK_VERSION_KEY)
+
+
+def menu_cache_stats() -> dict:
+    hits = cache.get(MENU_HITS_KEY, 0)
+    misses = cache.get(MENU_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "version": get_menu_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_menu_cache_stats() -> None:
+    cache.delete_many([MENU_HITS_KEY, MENU_MISSES_KEY])
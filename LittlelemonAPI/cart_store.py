@@ -0,0 +1,604 @@
+"""
+Where carts live between checkouts.
+
+The cart views (CartItemsView, OrderItemsView) talk to a cart backend
+instead of the CartItem table directly. The backend is picked with the
+CART_BACKEND setting:
+
+- DatabaseCartBackend (default): every change is a CartItem write, as
+  before.
+- CacheCartBackend: each user's cart is one dict in the cache
+  ({menuitem_id: quantity}) that reads and writes are served from.
+  A change holds a per-cart lock (cache.add) while it reads, changes
+  and writes back the dict, so concurrent changes don't drop each other.
+  Changed carts are written back to CartItem later by
+  `manage.py flush_carts`, and always right before checkout, so orders
+  are only ever made from persisted rows. Needs a cache every process
+  shares (CACHE_URL), not the per-process locmem default.
+
+Carts nobody has touched for a while are deleted by
+`manage.py compact_carts`.
+
+Cart lines are plain {"id", "menuitem", "quantity"} dicts. With the
+cache backend a line's id is its menu item id, since a line has no
+CartItem row until it is flushed.
+"""
+
+import datetime
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Max,
+    Min,
+    Sum,
+    Window,
+)
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from LittlelemonAPI.cache import get_menu_version
+from LittlelemonAPI.models import CartItem, MenuItem
+
+CART_KEY = "littlelemon:cart:{user_id}"
+CART_SUMMARY_KEY = "littlelemon:cart:summary:{user_id}"
+# held while a cached cart is read, changed and written back
+CART_LOCK_KEY = "littlelemon:cart:lock:{user_id}"
+CART_LOCK_TIMEOUT = 5  # seconds, also how long a change waits for the lock
+# write-behind log: "seq" numbers the dirty markers, "flushed" is how far
+# flush_carts got. An atomic incr per marker means no marker can be lost
+# to two processes writing the log at once.
+DIRTY_SEQ_KEY = "littlelemon:cart:dirty:seq"
+DIRTY_FLUSHED_KEY = "littlelemon:cart:dirty:flushed"
+DIRTY_ENTRY_KEY = "littlelemon:cart:dirty:{seq}"
+
+
+class AlreadyInCart(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "This menu item is already in your cart."
+    default_code = "already_in_cart"
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Your cart is being changed by another request, try again."
+    default_code = "cart_busy"
+
+
+MAX_QUANTITY = 40  # CartItem.quantity's validator
+
+SET, INCREMENT, REMOVE = "set", "increment", "remove"
+
+# scalar min/max per database for the batch upsert's clamp. Databases
+# without ON CONFLICT DO UPDATE aren't listed and take a slower path.
+UPSERT_MIN_MAX = {"sqlite": ("MIN", "MAX"), "postgresql": ("LEAST", "GREATEST")}
+
+
+def clamp_quantity(quantity: int) -> int:
+    return max(0, min(quantity, MAX_QUANTITY))
+
+
+class CartChange(NamedTuple):
+    """
+    The folded change to one cart line. An increment adds `quantity` and
+    then keeps the result between `low` and `high`: clamping to 0..40
+    after each of several increments in a row comes down to one such
+    range.
+    """
+
+    op: str
+    quantity: int = 0
+    low: int = 0
+    high: int = MAX_QUANTITY
+
+    def applied_to(self, current: int) -> int:
+        if self.op == INCREMENT:
+            return max(self.low, min(self.high, current + self.quantity))
+        return clamp_quantity(self.quantity)
+
+
+def fold_cart_operations(operations) -> dict:
+    """
+    Collapse a list of {"menuitem", "op", "quantity"} operations into one
+    CartChange per menu item with the same end result as applying them
+    in order, each clamped to 0..40. A batch can then touch each cart
+    row once.
+    """
+    folded = {}
+    for operation in operations:
+        menuitem_id, op = operation["menuitem"], operation["op"]
+        quantity = operation.get("quantity", 0)
+        previous = folded.get(menuitem_id)
+        if op == INCREMENT and previous is not None:
+            if previous.op == INCREMENT:
+                change = CartChange(
+                    INCREMENT,
+                    previous.quantity + quantity,
+                    clamp_quantity(previous.low + quantity),
+                    clamp_quantity(previous.high + quantity),
+                )
+            else:
+                # the quantity before this step is known, it's a set
+                base = 0 if previous.op == REMOVE else previous.quantity
+                change = CartChange(SET, clamp_quantity(base + quantity))
+        elif op == SET:
+            change = CartChange(SET, clamp_quantity(quantity))
+        else:
+            change = CartChange(op, quantity)
+        folded[menuitem_id] = change
+    return folded
+
+
+class DatabaseCartBackend:
+    """
+    Carts are CartItem rows.
+    """
+
+    def items(self, user_id) -> List[dict]:
+        return list(
+            CartItem.objects.filter(user_id=user_id)
+            .order_by("id")
+            .values("id", "menuitem", "quantity")
+        )
+
+    def get(self, user_id, pk) -> Optional[dict]:
+        return (
+            CartItem.objects.filter(user_id=user_id, pk=pk)
+            .values("id", "menuitem", "quantity")
+            .first()
+        )
+
+    def add(self, user_id, menuitem_id, quantity) -> dict:
+        try:
+            with transaction.atomic():
+                item = CartItem.objects.create(
+                    user_id=user_id, menuitem_id=menuitem_id, quantity=quantity
+                )
+        except IntegrityError:
+            raise AlreadyInCart()
+        invalidate_cart_summary(user_id)
+        return {"id": item.id, "menuitem": menuitem_id, "quantity": quantity}
+
+    def update(self, user_id, pk, menuitem_id, quantity) -> Optional[dict]:
+        try:
+            with transaction.atomic():
+                updated = CartItem.objects.filter(user_id=user_id, pk=pk).update(
+                    menuitem_id=menuitem_id,
+                    quantity=quantity,
+                    updated_at=timezone.now(),
+                )
+        except IntegrityError:
+            raise AlreadyInCart()
+        if not updated:
+            return None
+        invalidate_cart_summary(user_id)
+        return {"id": int(pk), "menuitem": menuitem_id, "quantity": quantity}
+
+    def remove(self, user_id, pk) -> bool:
+        deleted, _ = CartItem.objects.filter(user_id=user_id, pk=pk).delete()
+        invalidate_cart_summary(user_id)
+        return bool(deleted)
+
+    def clear(self, user_id) -> None:
+        CartItem.objects.filter(user_id=user_id).delete()
+        invalidate_cart_summary(user_id)
+
+    def apply(self, user_id, folded: dict) -> None:
+        """
+        Apply fold_cart_operations() output: one DELETE for the removes
+        and one INSERT .. ON CONFLICT DO UPDATE for the sets and
+        increments.
+        """
+        removes = [m for m, change in folded.items() if change.op == REMOVE]
+        upserts = {m: change for m, change in folded.items() if change.op != REMOVE}
+        with transaction.atomic():
+            if removes:
+                CartItem.objects.filter(
+                    user_id=user_id, menuitem_id__in=removes
+                ).delete()
+            if upserts:
+                self._upsert(user_id, upserts)
+        invalidate_cart_summary(user_id)
+
+    @staticmethod
+    def _upsert(user_id, upserts: dict) -> None:
+        connection = connections[CartItem.objects.db]
+        if connection.vendor not in UPSERT_MIN_MAX:
+            for menuitem_id, change in upserts.items():
+                item, created = CartItem.objects.get_or_create(
+                    user_id=user_id,
+                    menuitem_id=menuitem_id,
+                    defaults={"quantity": change.applied_to(0)},
+                )
+                if not created:
+                    item.quantity = change.applied_to(item.quantity)
+                    item.save(update_fields=["quantity", "updated_at"])
+            return
+
+        least, greatest = UPSERT_MIN_MAX[connection.vendor]
+        qn = connection.ops.quote_name
+        table = qn(CartItem._meta.db_table)
+        user, menuitem, quantity = qn("user_id"), qn("menuitem_id"), qn("quantity")
+        created_at, updated_at = qn("created_at"), qn("updated_at")
+
+        now = timezone.now()
+        params = []
+        for menuitem_id, change in upserts.items():
+            params += [user_id, menuitem_id, change.applied_to(0), now, now]
+        # sets take the new quantity, increments add the requested amount
+        # within their range (excluded.quantity is what a new row gets, so
+        # it can't be used for those)
+        increments = [
+            (m, change) for m, change in upserts.items() if change.op == INCREMENT
+        ]
+        new_quantity = f"excluded.{quantity}"
+        if increments:
+            cases = " ".join(
+                f"WHEN %s THEN {greatest}(%s, {least}(%s, {table}.{quantity} + %s))"
+                for _ in increments
+            )
+            new_quantity = (
+                f"CASE excluded.{menuitem} {cases} ELSE excluded.{quantity} END"
+            )
+            for menuitem_id, change in increments:
+                params += [menuitem_id, change.low, change.high, change.quantity]
+
+        sql = (
+            f"INSERT INTO {table} "
+            f"({user}, {menuitem}, {quantity}, {created_at}, {updated_at}) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(upserts))} "
+            f"ON CONFLICT ({menuitem}, {user}) DO UPDATE SET {quantity} = "
+            f"{greatest}(0, {least}({MAX_QUANTITY}, {new_quantity})), "
+            f"{updated_at} = excluded.{updated_at}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def persist(self, user_id) -> None:
+        """
+        Make sure the CartItem rows match the cart. Always true here.
+        """
+
+    def forget(self, user_id) -> None:
+        """
+        Drop anything held for the cart outside the database.
+        """
+        invalidate_cart_summary(user_id)
+
+
+class CacheCartBackend:
+    """
+    Carts are {menuitem_id: quantity} dicts in the cache, written back
+    to CartItem by persist().
+    """
+
+    def __init__(self, timeout: Optional[int] = None):
+        # how long a clean (already persisted) cart stays cached. Dirty
+        # carts never expire, they'd take unsaved changes with them.
+        self.timeout = timeout if timeout is not None else settings.CART_CACHE_TIMEOUT
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return CART_KEY.format(user_id=user_id)
+
+    @contextmanager
+    def _locked(self, user_id):
+        """
+        Hold the user's cart lock, so two requests changing the same cart
+        can't both read it and have the second write drop the first's
+        change. Raises CartBusy after waiting CART_LOCK_TIMEOUT.
+        """
+        key = CART_LOCK_KEY.format(user_id=user_id)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + CART_LOCK_TIMEOUT
+        # expires by itself, should the process holding it die
+        while not cache.add(key, token, timeout=CART_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if cache.get(key) == token:  # not expired and taken over
+                cache.delete(key)
+
+    def _load(self, user_id) -> dict:
+        cart = cache.get(self._key(user_id))
+        if cart is None:
+            # not cached (yet, or any more): the table has the latest copy
+            lines = CartItem.objects.filter(user_id=user_id).values_list(
+                "menuitem_id", "quantity"
+            )
+            cart = {"items": dict(lines), "dirty": False}
+            # add, not set: a change saved meanwhile mustn't be overwritten
+            if not cache.add(self._key(user_id), cart, timeout=self.timeout):
+                return self._load(user_id)
+        return cart
+
+    def _save(self, user_id, cart: dict) -> None:
+        was_dirty = cart["dirty"]
+        cart["dirty"] = True
+        cart["version"] = cart.get("version", 0) + 1
+        cache.set(self._key(user_id), cart, timeout=None)
+        invalidate_cart_summary(user_id)
+        if not was_dirty:
+            # after the set, so a flush that sees the marker sees the cart
+            _mark_dirty(user_id)
+
+    @staticmethod
+    def _line(menuitem_id, quantity) -> dict:
+        return {"id": menuitem_id, "menuitem": menuitem_id, "quantity": quantity}
+
+    def items(self, user_id) -> List[dict]:
+        return [
+            self._line(m, q) for m, q in sorted(self._load(user_id)["items"].items())
+        ]
+
+    def get(self, user_id, pk) -> Optional[dict]:
+        quantity = self._load(user_id)["items"].get(int(pk))
+        return None if quantity is None else self._line(int(pk), quantity)
+
+    def add(self, user_id, menuitem_id, quantity) -> dict:
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            if menuitem_id in cart["items"]:
+                raise AlreadyInCart()
+            cart["items"][menuitem_id] = quantity
+            self._save(user_id, cart)
+        return self._line(menuitem_id, quantity)
+
+    def update(self, user_id, pk, menuitem_id, quantity) -> Optional[dict]:
+        pk = int(pk)
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            if pk not in cart["items"]:
+                return None
+            if menuitem_id != pk:
+                if menuitem_id in cart["items"]:
+                    raise AlreadyInCart()
+                del cart["items"][pk]
+            cart["items"][menuitem_id] = quantity
+            self._save(user_id, cart)
+        return self._line(menuitem_id, quantity)
+
+    def remove(self, user_id, pk) -> bool:
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            if cart["items"].pop(int(pk), None) is None:
+                return False
+            self._save(user_id, cart)
+        return True
+
+    def clear(self, user_id) -> None:
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            cart["items"] = {}
+            self._save(user_id, cart)
+
+    def apply(self, user_id, folded: dict) -> None:
+        with self._locked(user_id):
+            cart = self._load(user_id)
+            items = cart["items"]
+            for menuitem_id, change in folded.items():
+                if change.op == REMOVE:
+                    items.pop(menuitem_id, None)
+                else:
+                    items[menuitem_id] = change.applied_to(items.get(menuitem_id, 0))
+            self._save(user_id, cart)
+
+    def persist(self, user_id) -> None:
+        """
+        Write the cached cart to CartItem if it has unsaved changes.
+        """
+        cart = cache.get(self._key(user_id))
+        if cart is None or not cart["dirty"]:
+            return
+        # skip menu items deleted since they were put in the cart
+        existing = set(
+            MenuItem.objects.filter(id__in=cart["items"]).values_list("id", flat=True)
+        )
+        items = {m: q for m, q in cart["items"].items() if m in existing}
+        with transaction.atomic():
+            CartItem.objects.filter(user_id=user_id).exclude(
+                menuitem_id__in=items
+            ).delete()
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(user_id=user_id, menuitem_id=m, quantity=q)
+                    for m, q in items.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["menuitem", "user"],
+                update_fields=["quantity", "updated_at"],
+            )
+        transaction.on_commit(lambda: self._mark_clean(user_id, cart))
+
+    def _mark_clean(self, user_id, cart: dict) -> None:
+        # only if nothing changed while the rows were being written
+        try:
+            with self._locked(user_id):
+                latest = cache.get(self._key(user_id))
+                if latest is None:
+                    return
+                if latest.get("version") == cart.get("version"):
+                    cart["dirty"] = False
+                    cache.set(self._key(user_id), cart, timeout=self.timeout)
+                    return
+        except CartBusy:
+            pass
+        # still dirty, but _save only logs a clean cart turning dirty and
+        # the marker that got it here has been used up: log it again
+        _mark_dirty(user_id)
+
+    def forget(self, user_id) -> None:
+        cache.delete_many(
+            [self._key(user_id), CART_SUMMARY_KEY.format(user_id=user_id)]
+        )
+
+
+def _mark_dirty(user_id) -> None:
+    try:
+        seq = cache.incr(DIRTY_SEQ_KEY)
+    except ValueError:
+        cache.add(DIRTY_SEQ_KEY, 0, timeout=None)
+        seq = cache.incr(DIRTY_SEQ_KEY)
+    cache.set(DIRTY_ENTRY_KEY.format(seq=seq), user_id, timeout=None)
+
+
+def flush_dirty_carts(batch_size: int = 500) -> int:
+    """
+    Persist every cart changed since the last flush, reading the dirty
+    log `batch_size` markers at a time. Returns how many carts were
+    written.
+    """
+    backend = get_cart_backend()
+    flushed = 0
+    while True:
+        start = cache.get(DIRTY_FLUSHED_KEY, 0)
+        end = min(cache.get(DIRTY_SEQ_KEY, 0), start + batch_size)
+        if end <= start:
+            return flushed
+        keys = [DIRTY_ENTRY_KEY.format(seq=seq) for seq in range(start + 1, end + 1)]
+        for user_id in set(cache.get_many(keys).values()):
+            backend.persist(user_id)
+            flushed += 1
+        cache.set(DIRTY_FLUSHED_KEY, end, timeout=None)
+        cache.delete_many(keys)
+
+
+def compact_carts(
+    older_than: datetime.timedelta, batch_size: int = 1000, pause: float = 0
+) -> dict:
+    """
+    Delete abandoned carts: every line of users whose cart hasn't
+    changed for `older_than`. The table is walked in id ranges of
+    `batch_size`, one short DELETE transaction per range, sleeping
+    `pause` seconds in between, so writers are never held up for long.
+    Returns {"rows", "carts", "batches", "seconds"}.
+    """
+    started = time.monotonic()
+    flush_dirty_carts()  # changes still only in the cache count as activity
+    cutoff = timezone.now() - older_than
+    active = CartItem.objects.filter(updated_at__gte=cutoff).values("user_id")
+    bounds = CartItem.objects.aggregate(low=Min("id"), high=Max("id"))
+    backend = get_cart_backend()
+    rows = batches = 0
+    users = set()
+    if bounds["low"] is not None:
+        for low in range(bounds["low"], bounds["high"] + 1, batch_size):
+            with transaction.atomic():
+                stale = CartItem.objects.filter(
+                    id__gte=low, id__lt=low + batch_size, updated_at__lt=cutoff
+                ).exclude(user_id__in=active)
+                batch_users = set(stale.values_list("user_id", flat=True))
+                deleted, _ = stale.delete()
+            rows += deleted
+            batches += 1
+            for user_id in batch_users - users:
+                backend.forget(user_id)
+            users |= batch_users
+            if pause:
+                time.sleep(pause)
+    return {
+        "rows": rows,
+        "carts": len(users),
+        "batches": batches,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def invalidate_cart_summary(user_id) -> None:
+    cache.delete(CART_SUMMARY_KEY.format(user_id=user_id))
+
+
+def cart_summary(user_id) -> dict:
+    """
+    Line count, quantity, subtotal, tax and total of a user's cart, plus
+    each line's total, from one query over the cart joined to the menu:
+    the cart totals are window sums over all of the lines, repeated on
+    each row. Tax comes from the menu items' stored price_after_tax, so
+    it follows the same per-category rules as the menu (see tax.py).
+
+    Cached per user. Cart changes drop the entry and menu changes move
+    to a new menu version, which the entry is checked against.
+    """
+    key = CART_SUMMARY_KEY.format(user_id=user_id)
+    version = get_menu_version()
+    cached = cache.get(key)
+    if cached is not None and cached["version"] == version:
+        return cached["data"]
+
+    get_cart_backend().persist(user_id)  # the rows are what gets summed
+    money = DecimalField(max_digits=9, decimal_places=2)
+    line_total = ExpressionWrapper(
+        F("menuitem__price") * F("quantity"), output_field=money
+    )
+    taxed_total = ExpressionWrapper(
+        F("menuitem__price_after_tax") * F("quantity"), output_field=money
+    )
+    lines = list(
+        CartItem.objects.filter(user_id=user_id)
+        .order_by("id")
+        .annotate(
+            line_total=line_total,
+            cart_quantity=Window(Sum("quantity")),
+            cart_subtotal=Window(Sum(line_total), output_field=money),
+            cart_total=Window(Sum(taxed_total), output_field=money),
+        )
+        .values(
+            "menuitem",
+            "menuitem__title",
+            "quantity",
+            "line_total",
+            "cart_quantity",
+            "cart_subtotal",
+            "cart_total",
+        )
+    )
+    # an empty cart has no rows to carry the totals
+    totals = lines[0] if lines else {
+        "cart_quantity": 0,
+        "cart_subtotal": Decimal("0.00"),
+        "cart_total": Decimal("0.00"),
+    }
+    data = {
+        "line_count": len(lines),
+        "quantity": totals["cart_quantity"],
+        "subtotal": totals["cart_subtotal"],
+        "tax": totals["cart_total"] - totals["cart_subtotal"],
+        "total": totals["cart_total"],
+        "lines": [
+            {
+                "menuitem": line["menuitem"],
+                "title": line["menuitem__title"],
+                "quantity": line["quantity"],
+                "line_total": line["line_total"],
+            }
+            for line in lines
+        ],
+    }
+    cache.set(
+        key, {"version": version, "data": data}, timeout=settings.CART_CACHE_TIMEOUT
+    )
+    return data
+
+
+@lru_cache(maxsize=None)
+def _backend(path: str):
+    return import_string(path)()
+
+
+def get_cart_backend():
+    return _backend(settings.CART_BACKEND)
@@ -0,0 +1,239 @@
+"""
+Turning a user's cart into an order.
+
+The whole thing is set based: the cart and its menu prices are one read,
+stock is taken with one conditional UPDATE, the order lines (with their
+prices snapshotted) are one bulk_create, the daily sales rollups are
+moved with one UPDATE each and the cart is cleared with one DELETE, all
+in the same transaction. The number of queries doesn't depend on
+how many lines the cart has.
+
+In async mode the request only queues a CheckoutJob and the
+process_checkout_jobs worker calls place_order() later.
+"""
+
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from LittlelemonAPI.cache import forget_stock
+from LittlelemonAPI.cart_store import get_cart_backend
+from LittlelemonAPI.models import CartItem, CheckoutJob, MenuItem, Order, OrderItem
+from LittlelemonAPI.sales import record_order
+from LittlelemonAPI.utils import get_best_delivery_person
+
+logger = logging.getLogger(__name__)
+
+
+class EmptyCart(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Your cart is empty."
+    default_code = "empty_cart"
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough stock for some items in your cart."
+    default_code = "out_of_stock"
+
+    def __init__(self, items=()):
+        super().__init__()
+        # set directly, APIException would turn the numbers into strings
+        self.detail = {"detail": self.default_detail, "items": list(items)}
+
+
+def reserve_inventory(needed: dict) -> None:
+    """
+    Take {menuitem_id: quantity} off stock in one conditional UPDATE
+    (... SET inventory = inventory - qty WHERE inventory >= qty), so two
+    checkouts can never both take the last one. Items without an
+    inventory aren't tracked and should not be passed in. Raises
+    OutOfStock, with nothing changed, when any item is short.
+    """
+    if not needed:
+        return
+    quantity = Case(
+        *[When(id=menuitem_id, then=Value(qty)) for menuitem_id, qty in needed.items()],
+        output_field=IntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            reserved = MenuItem.objects.filter(
+                id__in=needed, inventory__gte=quantity
+            ).update(inventory=F("inventory") - quantity, updated_at=timezone.now())
+            if reserved != len(needed):
+                raise OutOfStock()  # undo the rows that did have enough
+    except OutOfStock:
+        short = (
+            MenuItem.objects.filter(id__in=needed)
+            .exclude(inventory__gte=quantity)
+            .order_by("id")
+            .values_list("id", "title", "inventory")
+        )
+        raise OutOfStock(
+            {
+                "menuitem": menuitem_id,
+                "title": title,
+                "available": inventory or 0,
+                "requested": needed[menuitem_id],
+            }
+            for menuitem_id, title, inventory in short
+        )
+    # update() skips the menu signals; only stock changed, so the cached
+    # pages can stay and just these items' inventory is dropped
+    ids = list(needed)
+    transaction.on_commit(lambda: forget_stock(ids))
+
+
+def place_order(user) -> Order:
+    """
+    Create an order from `user`'s cart, take it off stock and empty the
+    cart. Raises EmptyCart when there is nothing to order and OutOfStock
+    when there isn't enough of something.
+    """
+    cart_backend = get_cart_backend()
+    cart_backend.persist(user.id)  # orders are only made from CartItem rows
+    with transaction.atomic():
+        cart = CartItem.objects.filter(user=user)
+        lines = list(
+            cart.select_for_update().values_list(
+                "menuitem_id", "quantity", "menuitem__inventory", "menuitem__price"
+            )
+        )
+        if not lines:
+            raise EmptyCart()
+        reserve_inventory(
+            {
+                menuitem_id: quantity
+                for menuitem_id, quantity, inventory, _ in lines
+                if inventory is not None
+            }
+        )
+        # the prices are snapshotted on the lines, so later menu changes
+        # don't rewrite what was charged
+        order_items = [
+            OrderItem(
+                menuitem_id=menuitem_id,
+                quantity=quantity,
+                unit_price=price,
+                line_total=price * quantity,
+            )
+            for menuitem_id, quantity, _, price in lines
+        ]
+        order = Order.objects.create(
+            user=user,
+            total=sum(item.line_total for item in order_items),
+            item_count=sum(item.quantity for item in order_items),
+            date=timezone.localdate(),  # the same "today" as the reports
+            delivery_crew=get_best_delivery_person(),
+            in_sales_rollups=True,  # recorded just below
+        )
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        record_order(
+            order.date,
+            order.total,
+            [
+                (item.menuitem_id, item.quantity, item.line_total)
+                for item in order_items
+            ],
+        )
+        cart.delete()
+        transaction.on_commit(lambda: cart_backend.forget(user.id))
+    return order
+
+
+def enqueue_checkout(user) -> CheckoutJob:
+    """
+    Queue a checkout of `user`'s cart. A user with a job already waiting
+    gets that job back instead of a second one.
+    """
+    get_cart_backend().persist(user.id)  # the worker reads CartItem rows
+    if not CartItem.objects.filter(user=user).exists():
+        raise EmptyCart()
+    job = CheckoutJob.objects.filter(
+        user=user, status__in=[CheckoutJob.PENDING, CheckoutJob.RUNNING]
+    ).first()
+    return job or CheckoutJob.objects.create(user=user)
+
+
+def claim_checkout_jobs(limit: int, stale_after: datetime.timedelta) -> list:
+    """
+    Mark up to `limit` pending jobs as running and return them, oldest
+    first. Jobs left running longer than `stale_after` (their worker
+    died) go back to pending first: a job's order and its "done" status
+    commit together, so a job that is still running made no order.
+    """
+    now = timezone.now()
+    CheckoutJob.objects.filter(
+        status=CheckoutJob.RUNNING, claimed_at__lt=now - stale_after
+    ).update(status=CheckoutJob.PENDING, claimed_at=None)
+    with transaction.atomic():
+        ids = list(
+            CheckoutJob.objects.select_for_update(skip_locked=True)
+            .filter(status=CheckoutJob.PENDING)
+            .order_by("id")
+            .values_list("id", flat=True)[:limit]
+        )
+        # conditional, so two workers can't both claim a job
+        CheckoutJob.objects.filter(id__in=ids, status=CheckoutJob.PENDING).update(
+            status=CheckoutJob.RUNNING, claimed_at=now
+        )
+    return list(
+        CheckoutJob.objects.filter(
+            id__in=ids, status=CheckoutJob.RUNNING, claimed_at=now
+        )
+        .select_related("user")
+        .order_by("id")
+    )
+
+
+def _finish(job: CheckoutJob, job_status: str, order=None, error: str = "") -> bool:
+    """
+    Record the job's outcome, unless it was requeued and claimed again
+    meanwhile. Returns whether it was recorded.
+    """
+    return bool(
+        CheckoutJob.objects.filter(
+            pk=job.pk, status=CheckoutJob.RUNNING, claimed_at=job.claimed_at
+        ).update(
+            status=job_status,
+            order=order,
+            error=error[:255],
+            finished_at=timezone.now(),
+        )
+    )
+
+
+def run_checkout_job(job: CheckoutJob) -> None:
+    try:
+        with transaction.atomic():
+            order = place_order(job.user)
+            if not _finish(job, CheckoutJob.DONE, order=order):
+                transaction.set_rollback(True)  # lost the claim, drop this order
+    except APIException as exc:
+        detail = exc.detail
+        if isinstance(detail, dict):
+            detail = detail.get("detail", detail)
+        _finish(job, CheckoutJob.FAILED, error=str(detail))
+    except Exception:
+        logger.exception("checkout job %s failed", job.pk)
+        _finish(job, CheckoutJob.FAILED, error="Checkout failed.")
+
+
+def process_checkout_jobs(
+    batch_size: int, stale_after: datetime.timedelta = datetime.timedelta(minutes=5)
+) -> int:
+    """
+    Claim and run one batch of jobs. Returns how many were run.
+    """
+    jobs = claim_checkout_jobs(batch_size, stale_after)
+    for job in jobs:
+        run_checkout_job(job)
+    return len(jobs)
@@ -0,0 +1,54 @@
+"""
+ETag / Last-Modified support for read endpoints.
+
+Views work out a validator from something cheap (the menu version, a
+row's updated_at) *before* querying and serializing the body, and return
+a 304 right away when the client already has that version:
+
+    validators = Validators(request, etag_parts=(...), last_modified=...)
+    not_modified = validators.check()
+    if not_modified is not None:
+        return not_modified
+    ...
+    return validators.apply(Response(data))
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Iterable, Optional
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class Validators:
+    def __init__(
+        self,
+        request,
+        etag_parts: Iterable = (),
+        last_modified: Optional[datetime] = None,
+    ):
+        # the body differs per renderer (json vs browsable api)
+        renderer = getattr(request, "accepted_renderer", None)
+        parts = [*etag_parts, getattr(renderer, "format", "")]
+        digest = hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()
+        self.request = request
+        self.etag = quote_etag(digest)
+        self.last_modified = (
+            int(last_modified.timestamp()) if last_modified is not None else None
+        )
+
+    def check(self):
+        """
+        A 304 (or 412) response if the client's copy is current, else None.
+        """
+        response = get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.last_modified
+        )
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        response["ETag"] = self.etag
+        if self.last_modified is not None:
+            response["Last-Modified"] = http_date(self.last_modified)
+        return response
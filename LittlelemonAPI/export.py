@@ -0,0 +1,110 @@
+"""
+Streaming exports.
+
+Rows come from `ValuesSerializer.values(queryset).iterator(chunk_size)`,
+so only one chunk of rows is in memory at a time however big the table
+is, and each row is turned into one line of output as it is read.
+"""
+
+import csv
+import io
+from typing import Iterable, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from LittlelemonAPI.fastserializers import ValuesSerializer
+
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Lets content negotiation accept an export media type. The export is
+    streamed by the view and never goes through render(); only error
+    responses (400, 403) do, and those are sent as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class JSONLinesRenderer(ExportRenderer):
+    media_type = EXPORT_FORMATS["jsonl"]
+    format = "jsonl"
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = EXPORT_FORMATS["csv"]
+    format = "csv"
+
+
+EXPORT_RENDERERS = [JSONLinesRenderer, CSVRenderer]
+
+
+def csv_header(serializer: ValuesSerializer, plan=None, prefix: str = "") -> List[str]:
+    """
+    Column names for the flattened serializer output, nested fields as
+    "category.title".
+    """
+    header = []
+    for name, column, step in plan if plan is not None else serializer.plan:
+        if column is None:
+            header += csv_header(serializer, step, f"{prefix}{name}.")
+        else:
+            header.append(prefix + name)
+    return header
+
+
+def _flatten(plan, data) -> list:
+    """
+    Serializer output as one flat list of values, in csv_header() order.
+    A null nested object fills its columns with None.
+    """
+    out = []
+    for name, column, step in plan:
+        value = data.get(name) if data else None
+        if column is None:
+            out += _flatten(step, value)
+        else:
+            out.append(value)
+    return out
+
+
+def jsonl_lines(serializer: ValuesSerializer, rows: Iterable[dict]) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(serializer.serialize_one(row)) + "\n"
+
+
+def csv_lines(serializer: ValuesSerializer, rows: Iterable[dict]) -> Iterator[str]:
+    plan = serializer.plan
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values) -> str:
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(csv_header(serializer))
+    for row in rows:
+        yield line(_flatten(plan, serializer.serialize_one(row)))
+
+
+def export_lines(serializer: ValuesSerializer, queryset, output: str, chunk_size: int):
+    """
+    Lines of `output` ("jsonl" or "csv") for every row of `queryset`.
+    """
+    rows = serializer.values(queryset).iterator(chunk_size=chunk_size)
+    if output == "csv":
+        return csv_lines(serializer, rows)
+    return jsonl_lines(serializer, rows)
@@ -0,0 +1,109 @@
+"""
+The featured menu item ("item of the day").
+
+A partial unique constraint allows one MenuItem with featured=True, so
+switching is an UPDATE of the old row plus a save of the new one, never
+a rewrite of the whole table. Future switches go in FeaturedSchedule and
+are applied by the first read after their start time. Reads are served
+from the cache, keyed on the menu version (any menu write invalidates
+them) and kept no longer than the next scheduled switch. The inventory
+is laid over them as they are served, see cache.py.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from LittlelemonAPI.cache import get_menu_version, with_live_stock
+from LittlelemonAPI.models import FeaturedSchedule, MenuItem
+from LittlelemonAPI.serializers import MenuItemSerializer
+
+FEATURED_KEY_PREFIX = "littlelemon:menu:featured"
+
+
+def clear_featured(exclude_pk=None) -> int:
+    """
+    Unset the current featured item (at most one row). Call it in the
+    same transaction.atomic() as the save that features the new item:
+    the old row stays locked until then, so concurrent switches queue
+    up instead of tripping the one-featured-item constraint.
+    """
+    current = MenuItem.objects.filter(featured=True)
+    if exclude_pk is not None:
+        current = current.exclude(pk=exclude_pk)
+    locked = list(current.select_for_update().values_list("pk", flat=True))
+    if not locked:
+        return 0
+    return MenuItem.objects.filter(pk__in=locked).update(
+        featured=False, updated_at=timezone.now()
+    )
+
+
+def set_featured_item(item: MenuItem) -> MenuItem:
+    with transaction.atomic():
+        clear_featured(exclude_pk=item.pk)
+        if not item.featured:
+            item.featured = True
+            # post_save bumps the menu version, dropping cached reads
+            item.save(update_fields=["featured", "updated_at"])
+    return item
+
+
+def schedule_featured_item(item: MenuItem, starts_at) -> FeaturedSchedule:
+    schedule = FeaturedSchedule.objects.create(menuitem=item, starts_at=starts_at)
+    # the cached read may be set to live past this start time
+    cache.delete(_featured_key(get_menu_version()))
+    return schedule
+
+
+def apply_due_schedules(now=None) -> bool:
+    """
+    Switch to the latest schedule entry that has started, if any.
+    """
+    now = now or timezone.now()
+    due = FeaturedSchedule.objects.filter(applied=False, starts_at__lte=now)
+    latest = due.select_related("menuitem").order_by("-starts_at", "-id").first()
+    if latest is None:
+        return False
+    with transaction.atomic():
+        set_featured_item(latest.menuitem)
+        due.update(applied=True)
+    return True
+
+
+def _featured_key(version: int) -> str:
+    return f"{FEATURED_KEY_PREFIX}:{version}"
+
+
+def get_featured_item_data():
+    """
+    Serialized featured item, or None when there isn't one.
+    """
+    now = timezone.now()
+    version = get_menu_version()
+    cached = cache.get(_featured_key(version))
+    if cached is not None and (cached["until"] is None or now < cached["until"]):
+        return _with_stock(cached["data"], version)
+
+    apply_due_schedules(now)
+    version = get_menu_version()  # moved on if a schedule was applied
+    item = MenuItem.objects.select_related("category").filter(featured=True).first()
+    data = dict(MenuItemSerializer(item).data) if item is not None else None
+    until = (
+        FeaturedSchedule.objects.filter(applied=False, starts_at__gt=now)
+        .order_by("starts_at")
+        .values_list("starts_at", flat=True)
+        .first()
+    )
+    cache.set(
+        _featured_key(version),
+        {"data": data, "until": until},
+        timeout=settings.MENU_CACHE_TIMEOUT,
+    )
+    return _with_stock(data, version)
+
+
+def _with_stock(data, version: int):
+    # checkout doesn't drop the cached read, see cache.py
+    return with_live_stock([data], version)[0] if data is not None else None
@@ -0,0 +1,152 @@
+"""
+Idempotency-Key support for endpoints that create or change orders.
+
+A client that sends `Idempotency-Key: <unique string>` with a request
+can safely retry it: the first response is stored (IdempotencyKey) and
+every retry with the same key gets that response back without the view
+running again. Keys are per user and live for IDEMPOTENCY_KEY_TTL.
+Looking a key up is one read through the unique (user, key) index.
+
+Only responses the view returns are stored. When the view raises (bad
+input, empty cart, ...) the key is released so the client can retry.
+A key whose request never answered (its worker was killed) is only held
+for IDEMPOTENCY_LOCK_TIMEOUT, then a retry runs the request again.
+"""
+
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from LittlelemonAPI.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# response headers worth replaying
+STORED_HEADERS = ("Location",)
+
+
+def _fingerprint(request: Request) -> str:
+    body = json.dumps(request.data, cls=DjangoJSONEncoder, sort_keys=True)
+    raw = f"{request.method} {request.get_full_path()} {body}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    response = Response(record.response, status=record.status_code)
+    for name, value in record.headers.items():
+        response[name] = value
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _claim(user, key: str, fingerprint: str):
+    """
+    Take the key for this request. Returns the claimed IdempotencyKey
+    when it's ours to run, otherwise the response to send instead.
+    """
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.expires_at <= now:
+        record.delete()
+        record = None
+    if (
+        record is not None
+        and record.status_code is None
+        and record.locked_until is not None
+        and record.locked_until <= now
+    ):
+        # abandoned; conditional, so only one retry takes it over
+        IdempotencyKey.objects.filter(
+            pk=record.pk, status_code=None, locked_until=record.locked_until
+        ).delete()
+        record = None
+    if record is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now
+                    + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    locked_until=now
+                    + datetime.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT),
+                )
+        except IntegrityError:
+            # another request with this key got there first
+            return Response(
+                {"detail": "A request with this Idempotency-Key is in progress."},
+                status=status.HTTP_409_CONFLICT,
+            )
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"detail": "This Idempotency-Key was used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"detail": "A request with this Idempotency-Key is in progress."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return _replay(record)
+
+
+def idempotent(methods=("POST", "PATCH")):
+    """
+    Make a DRF view (function or viewset method) honour Idempotency-Key
+    for `methods`. Put it under @api_view / @action so it gets the DRF
+    request after authentication.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            key = request.headers.get(HEADER)
+            if (
+                not key
+                or request.method not in methods
+                or not request.user.is_authenticated
+            ):
+                return view(*args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {"detail": f"{HEADER} must be at most 255 characters."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            claimed = _claim(request.user, key, _fingerprint(request))
+            if isinstance(claimed, Response):
+                return claimed
+            # by pk: if our lock ran out, the key may be someone else's now
+            stored = IdempotencyKey.objects.filter(pk=claimed.pk)
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                stored.delete()
+                raise
+            if response.status_code >= 500 or not hasattr(response, "data"):
+                stored.delete()
+                return response
+            stored.update(
+                locked_until=None,
+                status_code=response.status_code,
+                response=response.data,
+                headers={
+                    name: response[name] for name in STORED_HEADERS if name in response
+                },
+            )
+            return response
+
+        return wrapper
+
+    return decorator
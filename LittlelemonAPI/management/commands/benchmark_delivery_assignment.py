@@ -0,0 +1,95 @@
+import datetime
+import time
+from collections import Counter
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from LittlelemonAPI.models import Order
+from LittlelemonAPI.workload import DELIVERY_GROUP, least_loaded_crew, rebuild_workloads
+
+
+def legacy_pick(orders):
+    """
+    The old get_best_delivery_person(Order.objects.all()): every order
+    loaded, plus one query per order for order.user.
+    """
+    delivery_users = User.objects.filter(groups__name=DELIVERY_GROUP)
+    user_ids = [order.user.id for order in orders]
+    Counter(user_ids).most_common()
+    for delivery_user in delivery_users:
+        if delivery_user.id not in user_ids:
+            return delivery_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Time picking a delivery driver at checkout with --orders throwaway "
+        "historical orders: the old scan over every order vs the workload "
+        "table. Nothing is left in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1_000_000)
+        parser.add_argument("--crew", type=int, default=25)
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument(
+            "--legacy-sample",
+            type=int,
+            default=5000,
+            help="Orders the old scan is timed on, then scaled to --orders "
+            "(it is linear and far too slow to run on all of them).",
+        )
+
+    def handle(self, *args, **options):
+        total = options["orders"]
+        with transaction.atomic():
+            group, _ = Group.objects.get_or_create(name=DELIVERY_GROUP)
+            customer = User.objects.create(username="benchmark-customer")
+            crew = User.objects.bulk_create(
+                User(username=f"benchmark-crew-{i}") for i in range(options["crew"])
+            )
+            group.user_set.add(*crew)
+
+            start = time.perf_counter()
+            today = datetime.date.today()
+            batch = 50_000
+            for offset in range(0, total, batch):
+                Order.objects.bulk_create(
+                    Order(
+                        user=customer,
+                        total=20,
+                        date=today,
+                        delivery_crew=crew[i % len(crew)],
+                        status=i % 10 != 0,  # 10% still open
+                    )
+                    for i in range(offset, min(offset + batch, total))
+                )
+            self.stdout.write(
+                f"created {total} orders in {time.perf_counter() - start:.1f}s"
+            )
+
+            start = time.perf_counter()
+            rebuild_workloads()
+            self.stdout.write(
+                f"rebuild_workloads    {time.perf_counter() - start:8.3f} s"
+            )
+
+            sample = min(options["legacy_sample"], total)
+            start = time.perf_counter()
+            legacy_pick(Order.objects.all()[:sample])
+            legacy = (time.perf_counter() - start) * total / sample
+            self.stdout.write(
+                f"old scan (estimated) {legacy:8.3f} s per checkout "
+                f"(timed on {sample} orders)"
+            )
+
+            start = time.perf_counter()
+            for _ in range(options["repeat"]):
+                least_loaded_crew()
+            per_pick = (time.perf_counter() - start) / options["repeat"]
+            self.stdout.write(
+                f"workload table       {per_pick * 1000:8.3f} ms per checkout"
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from LittlelemonAPI.models import Category, MenuItem
+from LittlelemonAPI.search import search_backend, search_menu_items
+
+WORDS = [
+    "lemon", "pasta", "pizza", "salmon", "grilled", "greek", "salad", "soup",
+    "bruschetta", "chicken", "feta", "olive", "garlic", "spicy", "tomato",
+    "basil", "cake", "ice", "cream", "lamb", "rice", "bean", "mint", "honey",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare full-text search against the icontains scan on a throwaway "
+        "menu of --items rows. Nothing is left in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        queries = ["pizz", "lemon cake", "grilled salmon", "gar", "honey mint"]
+        with transaction.atomic():
+            category = Category.objects.create(title="Benchmark", slug="benchmark")
+            self.stdout.write(f"Creating {options['items']} menu items...")
+            MenuItem.objects.bulk_create(
+                (
+                    MenuItem(
+                        title=f"{' '.join(rng.sample(WORDS, 3))} {i}",
+                        price=rng.randint(2, 40),
+                        category=category,
+                    )
+                    for i in range(options["items"])
+                ),
+                batch_size=5000,
+            )
+            self.stdout.write(f"Search backend: {search_backend()}")
+            for query in queries:
+                fts = self._time(
+                    lambda query=query: search_menu_items(
+                        MenuItem.objects.all(), query
+                    ),
+                    options,
+                )
+                scan = self._time(
+                    lambda query=query: MenuItem.objects.filter(
+                        title__icontains=query
+                    ).order_by("id"),
+                    options,
+                )
+                self.stdout.write(
+                    f"{query!r:18} index {fts * 1000:8.2f} ms   "
+                    f"icontains {scan * 1000:8.2f} ms"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _time(build, options):
+        """
+        Average seconds to count the matches and fetch the first page,
+        which is what a menu_items page request does.
+        """
+        size = options["page_size"]
+        start = time.perf_counter()
+        for _ in range(options["repeat"]):
+            queryset = build()
+            queryset.count()
+            list(queryset[:size])
+        return (time.perf_counter() - start) / options["repeat"]
@@ -0,0 +1,75 @@
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from LittlelemonAPI.models import Category, MenuItem, Order
+from LittlelemonAPI.serializers import (
+    MenuItemSerializer,
+    OrderSerializer,
+    menu_item_values,
+    order_values,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-row cost of the DRF serializers vs the .values() fast path on "
+        "--rows throwaway menu items and orders. Nothing is left in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with transaction.atomic():
+            category = Category.objects.create(title="Benchmark", slug="benchmark")
+            user = User.objects.create(username="benchmark-serializers")
+            MenuItem.objects.bulk_create(
+                MenuItem(title=f"bench item {i}", price=9, category=category)
+                for i in range(rows)
+            )
+            Order.objects.bulk_create(
+                Order(user=user, total=20, date=datetime.date.today())
+                for _ in range(rows)
+            )
+            items = MenuItem.objects.filter(category=category)
+            orders = Order.objects.filter(user=user)
+            self._report(
+                "menu items",
+                lambda: MenuItemSerializer(
+                    items.select_related("category"), many=True
+                ).data,
+                lambda: menu_item_values.serialize(menu_item_values.values(items)),
+                options,
+            )
+            self._report(
+                "orders",
+                lambda: OrderSerializer(orders, many=True).data,
+                lambda: order_values.serialize(order_values.values(orders)),
+                options,
+            )
+            transaction.set_rollback(True)
+
+    def _report(self, label, slow, fast, options):
+        slow_us = self._per_row(slow, options)
+        fast_us = self._per_row(fast, options)
+        self.stdout.write(
+            f"{label:12} serializer {slow_us:7.2f} us/row   "
+            f"values {fast_us:7.2f} us/row   ({slow_us / fast_us:.1f}x)"
+        )
+
+    @staticmethod
+    def _per_row(build, options):
+        """
+        Microseconds per row, query included (that's what a request pays).
+        """
+        start = time.perf_counter()
+        for _ in range(options["repeat"]):
+            build()
+        elapsed = time.perf_counter() - start
+        return elapsed / (options["repeat"] * options["rows"]) * 1_000_000
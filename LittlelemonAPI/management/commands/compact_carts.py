@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.cart_store import compact_carts
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete carts that haven't changed for --days days, a --batch-size "
+        "id range at a time. Run it periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=30)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches, to go easier on a busy database.",
+        )
+
+    def handle(self, *args, **options):
+        result = compact_carts(
+            datetime.timedelta(days=options["days"]),
+            batch_size=options["batch_size"],
+            pause=options["sleep"],
+        )
+        rate = result["rows"] / result["seconds"] if result["seconds"] else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {result['rows']} cart rows from {result['carts']} carts "
+                f"in {result['batches']} batches, {result['seconds']:.2f}s "
+                f"({rate:.0f} rows/s)."
+            )
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.cart_store import flush_dirty_carts
+
+
+class Command(BaseCommand):
+    help = (
+        "Write carts changed in the cache back to the CartItem table "
+        "(CacheCartBackend only). Run it periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        flushed = flush_dirty_carts(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts."))
@@ -0,0 +1,41 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.checkout import process_checkout_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker for async checkout: claims queued checkout jobs in batches "
+        "and creates their orders. Runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--sleep", type=float, default=1.0, help="Seconds to wait when idle."
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=300,
+            help="Seconds after which a running job is assumed lost and requeued.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue, then exit."
+        )
+
+    def handle(self, *args, **options):
+        stale_after = datetime.timedelta(seconds=options["stale_after"])
+        processed = 0
+        while True:
+            count = process_checkout_jobs(options["batch_size"], stale_after)
+            processed += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} checkout jobs."))
@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from LittlelemonAPI.models import DailyOrderTotals, DailySales, Order
+from LittlelemonAPI.sales import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups from the orders between --from and "
+        "--to (default: every date with orders or rollup rows), --chunk-days "
+        "days per transaction. Run after changing orders in ways that skip "
+        "checkout and order deletion, e.g. creating them in the admin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="date_from", type=datetime.date.fromisoformat
+        )
+        parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat)
+        parser.add_argument("--chunk-days", type=int, default=31)
+
+    def handle(self, *args, **options):
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+        # rollup rows left on dates without orders must be cleared too
+        bounds = [
+            model.objects.aggregate(first=Min("date"), last=Max("date"))
+            for model in (Order, DailySales, DailyOrderTotals)
+        ]
+        firsts = [b["first"] for b in bounds if b["first"] is not None]
+        lasts = [b["last"] for b in bounds if b["last"] is not None]
+        date_from = options["date_from"] or min(firsts, default=None)
+        date_to = options["date_to"] or max(lasts, default=None)
+        if date_from is None or date_to is None:
+            self.stdout.write("No orders or rollups, nothing to rebuild.")
+            return
+        if date_from > date_to:
+            raise CommandError("--from must not be after --to.")
+        result = rebuild_daily_sales(
+            date_from, date_to, chunk_days=options["chunk_days"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {result['days']} days ({date_from} to {date_to}), "
+                f"{result['rows']} item rows in {result['seconds']:.2f}s."
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.workload import rebuild_workloads
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount open orders per delivery crew member from the order table. "
+        "Run after bulk order updates that bypass the model signals."
+    )
+
+    def handle(self, *args, **options):
+        crew = rebuild_workloads()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt workload for {crew} crew."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the menu item title search index from the menu table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        backend = rebuild_search_index(options["database"])
+        if backend == "icontains":
+            self.stdout.write(
+                self.style.WARNING(
+                    "No full-text index on this database, search uses icontains."
+                )
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {backend} search index."))
@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import DatabaseError, migrations, models
+
+# copied from LittlelemonAPI/search.py as it was when this migration was
+# written, so later changes there don't change what this migration does
+MENUITEM_TABLE = "LittlelemonAPI_menuitem"
+FTS_TABLE = "LittlelemonAPI_menuitem_fts"
+PG_INDEX = "littlelemon_menuitem_title_fts"
+
+SQLITE_SETUP = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        title, content='{MENUITEM_TABLE}', content_rowid='id', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ai" AFTER INSERT ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ad" AFTER DELETE ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_au"
+    AFTER UPDATE OF title ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+]
+
+PG_SETUP = [
+    f"""
+    CREATE INDEX IF NOT EXISTS "{PG_INDEX}" ON "{MENUITEM_TABLE}"
+    USING GIN (to_tsvector('simple', title))
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                for statement in SQLITE_SETUP:
+                    cursor.execute(statement)
+            except DatabaseError:
+                return  # sqlite built without FTS5, search uses icontains
+            cursor.execute(f"""INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES ('rebuild')""")
+        elif connection.vendor == "postgresql":
+            for statement in PG_SETUP:
+                cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0009_remove_orderitem_price_remove_orderitem_unit_price_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemSearch',
+            fields=[
+                ('menuitem', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='LittlelemonAPI.menuitem')),
+                ('title', models.CharField(max_length=255)),
+            ],
+            options={
+                'db_table': 'LittlelemonAPI_menuitem_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
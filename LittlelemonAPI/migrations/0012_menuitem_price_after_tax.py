@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+import django.core.validators
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def price_with_tax(price, rate):
+    # the rounding of LittlelemonAPI/tax.py when this migration was written
+    return (Decimal(str(price)) * (1 + rate)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def fill_price_after_tax(apps, schema_editor):
+    MenuItem = apps.get_model('LittlelemonAPI', 'MenuItem')
+    rate = Decimal(str(settings.DEFAULT_TAX_RATE))  # no category overrides yet
+    items = list(MenuItem.objects.only('id', 'price'))
+    for item in items:
+        item.price_after_tax = price_with_tax(item.price, rate)
+    MenuItem.objects.bulk_update(items, ['price_after_tax'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0011_menuitem_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='tax_rate',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='price_after_tax',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=7),
+        ),
+        migrations.RunPython(fill_price_after_tax, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def keep_one_featured(apps, schema_editor):
+    # the unique constraint below needs at most one featured item
+    MenuItem = apps.get_model('LittlelemonAPI', 'MenuItem')
+    featured = list(MenuItem.objects.filter(featured=True).order_by('id').values_list('id', flat=True))
+    MenuItem.objects.filter(id__in=featured[:-1]).update(featured=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeaturedSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('applied', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(keep_one_featured, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='menuitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('featured', True)), fields=('featured',), name='one_featured_menuitem'),
+        ),
+        migrations.AddField(
+            model_name='featuredschedule',
+            name='menuitem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittlelemonAPI.menuitem'),
+        ),
+        migrations.AddIndex(
+            model_name='featuredschedule',
+            index=models.Index(fields=['applied', 'starts_at'], name='featured_pending_idx'),
+        ),
+    ]
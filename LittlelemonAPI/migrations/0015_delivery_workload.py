@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_open_orders(apps, schema_editor):
+    User = apps.get_model("auth", "User")
+    Order = apps.get_model("LittlelemonAPI", "Order")
+    DeliveryWorkload = apps.get_model("LittlelemonAPI", "DeliveryWorkload")
+    crew_ids = list(
+        User.objects.filter(groups__name="delivery").values_list("id", flat=True)
+    )
+    counts = dict(
+        Order.objects.filter(status=False, delivery_crew_id__in=crew_ids)
+        .values("delivery_crew_id")
+        .annotate(n=Count("id"))
+        .values_list("delivery_crew_id", "n")
+    )
+    DeliveryWorkload.objects.bulk_create(
+        DeliveryWorkload(crew_id=i, open_orders=counts.get(i, 0)) for i in crew_ids
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0014_featured_schedule'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryWorkload',
+            fields=[
+                ('crew', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='workload', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_orders', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['open_orders', 'crew'], name='workload_least_loaded_idx')],
+            },
+        ),
+        migrations.RunPython(count_open_orders, migrations.RunPython.noop),
+    ]
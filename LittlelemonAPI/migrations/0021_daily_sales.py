@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Sum
+from django.db.models.functions import Coalesce
+
+
+def build_rollups(apps, schema_editor):
+    Order = apps.get_model("LittlelemonAPI", "Order")
+    OrderItem = apps.get_model("LittlelemonAPI", "OrderItem")
+    DailySales = apps.get_model("LittlelemonAPI", "DailySales")
+    DailyOrderTotals = apps.get_model("LittlelemonAPI", "DailyOrderTotals")
+    money = DecimalField(max_digits=12, decimal_places=2)
+    sales = (
+        OrderItem.objects.values("order__date", "menuitem")
+        .annotate(
+            quantity=Sum("quantity"),
+            revenue=Coalesce(Sum("line_total"), 0, output_field=money),
+            order_count=Count("order", distinct=True),
+        )
+    )
+    DailySales.objects.bulk_create(
+        (
+            DailySales(
+                date=row["order__date"],
+                menuitem_id=row["menuitem"],
+                quantity=row["quantity"],
+                revenue=row["revenue"],
+                order_count=row["order_count"],
+            )
+            for row in sales.iterator()
+        ),
+        batch_size=1000,
+    )
+    totals = Order.objects.values("date").annotate(orders=Count("id"), revenue=Sum("total"))
+    DailyOrderTotals.objects.bulk_create(
+        (
+            DailyOrderTotals(date=row["date"], orders=row["orders"], revenue=row["revenue"])
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+    Order.objects.update(in_sales_rollups=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0020_order_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittlelemonAPI.menuitem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'menuitem'), name='dailysales_date_menuitem')],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='in_sales_rollups',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0021_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartitem',
+            name='quantity',
+            field=models.SmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(40)]),
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='inventory',
+            field=models.SmallIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(400)]),
+        ),
+    ]
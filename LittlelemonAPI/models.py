@@ -1,6 +1,7 @@
 from django.db import models
 
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from rest_framework.validators import UniqueValidator
 from rest_framework.decorators import api_view, permission_classes
@@ -10,6 +11,15 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 class Category(models.Model):
     slug = models.SlugField()
     title = models.CharField(max_length=255, db_index=True)
+    # e.g. 0.0500 for 5%. null means settings.DEFAULT_TAX_RATE applies
+    tax_rate = models.DecimalField(
+        max_digits=5,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+    )
+    updated_at = models.DateTimeField(auto_now=True)  # for ETag / Last-Modified
 
     def __str__(self) -> str:
         return self.title
@@ -31,6 +41,69 @@ class MenuItem(models.Model):
     inventory = models.SmallIntegerField(blank=True, null=True, validators=[MinValueValidator(0), MaxValueValidator(400)])
     category = models.ForeignKey(Category, on_delete=models.PROTECT, default=1)
     featured = models.BooleanField(default=False, db_index=True)
+    # kept up to date by a pre_save signal, see tax.py
+    price_after_tax = models.DecimalField(
+        max_digits=7, decimal_places=2, default=0, editable=False
+    )
+    updated_at = models.DateTimeField(auto_now=True)  # for ETag / Last-Modified
+
+    class Meta:
+        # one per public sort key, see ordering.py
+        indexes = [
+            models.Index(fields=["price", "id"], name="menuitem_price_id_idx"),
+            models.Index(
+                fields=["category", "price", "id"], name="menuitem_cat_price_id_idx"
+            ),
+            models.Index(
+                fields=["featured", "title"], name="menuitem_featured_title_idx"
+            ),
+        ]
+        constraints = [
+            # at most one item of the day, so switching touches two rows
+            models.UniqueConstraint(
+                fields=["featured"],
+                condition=models.Q(featured=True),
+                name="one_featured_menuitem",
+            ),
+        ]
+
+
+class FeaturedSchedule(models.Model):
+    """
+    A menu item to become the featured item at `starts_at`. Applied
+    lazily by the first featured read after that time, see featured.py.
+    """
+
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    starts_at = models.DateTimeField()
+    applied = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["applied", "starts_at"], name="featured_pending_idx"),
+        ]
+
+
+class MenuItemSearch(models.Model):
+    """
+    The FTS5 title index on SQLite (see search.py). Not a real table
+    Django manages: it's created and kept in sync by the database itself,
+    this model only exists so menu queries can join against it.
+    """
+
+    menuitem = models.OneToOneField(
+        MenuItem,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_index",
+    )
+    title = models.CharField(max_length=255)
+
+    class Meta:
+        managed = False
+        db_table = "LittlelemonAPI_menuitem_fts"
 
 
 class CartItem(models.Model):
@@ -40,9 +113,14 @@ class CartItem(models.Model):
         on_delete=models.CASCADE,
     )
     quantity = models.SmallIntegerField(default=1, validators=[MinValueValidator(0), MaxValueValidator(40)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )  # abandoned carts are compacted on this
 
     class Meta:
         unique_together = ("menuitem", "user")
+        indexes = [models.Index(fields=["updated_at"], name="cartitem_updated_at_idx")]
 
 
 class Order(models.Model):
@@ -62,6 +140,103 @@ class Order(models.Model):
     status = models.BooleanField(db_index=True, default=False)  # is order delivered?
     total = models.DecimalField(max_digits=6, decimal_places=2)  # price of all items!
     date = models.DateField(db_index=True)  # when order placed
+    updated_at = models.DateTimeField(auto_now=True)  # for ETag / Last-Modified
+    # sum of the lines' quantities, set at checkout (null: not backfilled yet)
+    item_count = models.PositiveIntegerField(null=True)
+    # added to the daily sales rollups (checkout, rebuild_daily_sales), so
+    # deleting it takes it back out
+    in_sales_rollups = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # the order list's filters, read newest first by (date, id)
+            models.Index(
+                fields=["delivery_crew", "status", "date", "id"],
+                name="order_crew_status_date_idx",
+            ),
+            models.Index(fields=["user", "date", "id"], name="order_user_date_idx"),
+            # the unfiltered (manager) list
+            models.Index(fields=["date", "id"], name="order_date_id_idx"),
+        ]
+
+
+class CheckoutJob(models.Model):
+    """
+    A queued checkout (async mode). The process_checkout_jobs worker
+    claims pending jobs in batches and turns each user's cart into an
+    order, see checkout.py.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's "next pending jobs, oldest first" read
+            models.Index(fields=["status", "id"], name="checkoutjob_status_idx"),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response to a request sent with an Idempotency-Key
+    header, replayed to retries of it until `expires_at`. A row with no
+    status_code is a request still being handled, until `locked_until`.
+    See idempotency.py.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path, body
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    expires_at = models.DateTimeField(db_index=True)
+    locked_until = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            # also the index every lookup reads through
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotency_user_key"
+            ),
+        ]
+
+
+class DeliveryWorkload(models.Model):
+    """
+    Open (undelivered) orders per delivery crew member, kept up to date
+    by signals on Order and on delivery group membership (see
+    workload.py) so picking a driver at checkout is one indexed read.
+    """
+
+    crew = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="workload"
+    )
+    open_orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["open_orders", "crew"], name="workload_least_loaded_idx"
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -74,6 +249,44 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
+    # the price charged, copied from the menu at checkout so order reads
+    # don't depend on today's menu (null: not backfilled yet)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    line_total = models.DecimalField(max_digits=6, decimal_places=2, null=True)
 
     class Meta:
         unique_together = ("order", "menuitem")
+
+
+class DailySales(models.Model):
+    """
+    Sales of one menu item on one day, kept up to date by checkout and
+    order deletion so reports read one row per day and item instead of
+    every order line. See sales.py.
+    """
+
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)  # orders with this item
+
+    class Meta:
+        constraints = [
+            # also the index reports read date ranges through
+            models.UniqueConstraint(
+                fields=["date", "menuitem"], name="dailysales_date_menuitem"
+            ),
+        ]
+
+
+class DailyOrderTotals(models.Model):
+    """
+    Orders and revenue per day, the DailySales counterpart for figures
+    that can't be summed from per-item rows (an order with two items is
+    still one order).
+    """
+
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
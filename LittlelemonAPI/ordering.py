@@ -0,0 +1,64 @@
+"""
+Whitelisted orderings for list endpoints.
+
+Clients pick a public sort key, we map it onto an `order_by` that
+matches an index column for column, so every list query can be served
+by an index-ordered scan instead of a filesort. Sort keys that aren't
+registered are rejected. A leading "-" on every term reverses the whole
+ordering (the index is just scanned backwards); mixing directions would
+need a sort, so it isn't allowed.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+from rest_framework.exceptions import ValidationError
+
+
+class IndexedOrdering(NamedTuple):
+    fields: Tuple[str, ...]
+    # name of the Meta.indexes entry backing it, None for pk / unique fields
+    index: Optional[str] = None
+
+
+MENU_ORDERINGS = {
+    "id": IndexedOrdering(("id",)),
+    "title": IndexedOrdering(("title",)),  # unique, has its own index
+    "price": IndexedOrdering(("price", "id"), "menuitem_price_id_idx"),
+    "category": IndexedOrdering(
+        ("category_id", "price", "id"), "menuitem_cat_price_id_idx"
+    ),
+    "featured": IndexedOrdering(("featured", "title"), "menuitem_featured_title_idx"),
+}
+# the multi key spellings of the same indexes
+MENU_ORDERINGS["category,price"] = MENU_ORDERINGS["category"]
+MENU_ORDERINGS["featured,title"] = MENU_ORDERINGS["featured"]
+
+DEFAULT_MENU_ORDERING = MENU_ORDERINGS["id"]
+
+
+def resolve_ordering(
+    raw: Optional[str],
+    registry=MENU_ORDERINGS,
+    default: IndexedOrdering = DEFAULT_MENU_ORDERING,
+) -> Tuple[str, ...]:
+    """
+    Turn an `?ordering=` value into `order_by` fields, or raise a 400.
+    """
+    terms = [term.strip() for term in (raw or "").split(",") if term.strip()]
+    if not terms:
+        return default.fields
+
+    descending = {term.startswith("-") for term in terms}
+    if len(descending) > 1:
+        raise ValidationError(
+            {"ordering": "All ordering keys must use the same direction."}
+        )
+    key = ",".join(term.lstrip("-") for term in terms)
+    if key not in registry:
+        raise ValidationError(
+            {"ordering": f"Unsupported ordering. Choose from: {', '.join(registry)}."}
+        )
+    fields = registry[key].fields
+    if descending.pop():
+        fields = tuple(f"-{field}" for field in fields)
+    return fields
@@ -0,0 +1,167 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET + COUNT, each page is fetched with a WHERE clause that
+starts right after the last row of the previous page, so deep pages cost
+the same as the first one. The cursor handed to clients is an opaque,
+urlsafe-base64 JSON blob holding the ordering key of the boundary row
+and the direction to read in.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import ForeignKey, Q
+from rest_framework.exceptions import ValidationError
+
+
+def get_page_size(query_params, param: str = "perpage", default: int = 2) -> int:
+    """
+    Read the page size from the query params, capped at MAX_PAGE_SIZE so
+    one client can't ask for the whole table in one go.
+    """
+    raw = query_params.get(param)
+    if not raw:
+        return default
+    try:
+        size = int(raw)
+    except ValueError:
+        raise ValidationError({param: "Must be a whole number."})
+    if size < 1:
+        raise ValidationError({param: "Must be at least 1."})
+    return min(size, settings.MAX_PAGE_SIZE)
+
+
+def encode_cursor(values: Sequence[Any], reverse: bool = False) -> str:
+    payload = json.dumps({"k": list(values), "r": reverse}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_length: int):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, reverse = payload["k"], bool(payload["r"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValidationError({"cursor": "Invalid cursor."})
+    if not isinstance(values, list) or len(values) != key_length:
+        # cursor from a different ordering
+        raise ValidationError({"cursor": "Cursor does not match the ordering."})
+    return values, reverse
+
+
+@dataclass
+class KeysetPage:
+    rows: List[Any]
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+    def as_dict(self, results) -> dict:
+        return {
+            "next": self.next_cursor,
+            "previous": self.previous_cursor,
+            "results": results,
+        }
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a list of `order_by` style fields, e.g.
+    ["-price", "id"]. "id" is appended as a tie breaker when missing so
+    the key is always unique. Works with model instances and with
+    `.values()` rows (as long as the key fields are in the values).
+    """
+
+    def __init__(self, ordering: Sequence[str], page_size: int):
+        ordering = [f.strip() for f in ordering if f.strip()]
+        if not any(f.lstrip("-") in ("id", "pk") for f in ordering):
+            ordering.append("id")
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def _resolve(self, model):
+        """
+        Map ordering names to (attname, descending) pairs, rejecting
+        fields that can't be used in a keyset comparison.
+        """
+        keys = []
+        for name in self.ordering:
+            desc = name.startswith("-")
+            name = name.lstrip("-")
+            if name == "pk":
+                name = model._meta.pk.attname
+            if "__" not in name:
+                try:
+                    model_field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    raise ValidationError({"ordering": f"Unknown field '{name}'."})
+                if model_field.null:
+                    raise ValidationError(
+                        {
+                            "ordering": f"Ordering on '{name}' is not supported "
+                            "with cursor pagination."
+                        }
+                    )
+                if isinstance(model_field, ForeignKey):
+                    name = model_field.attname
+            keys.append((name, desc))
+        return keys
+
+    @staticmethod
+    def _value(row, name):
+        if isinstance(row, dict):
+            return row[name]
+        for part in name.split("__"):
+            row = getattr(row, part)
+        return row
+
+    @staticmethod
+    def _after(keys, values, reverse) -> Q:
+        """
+        WHERE clause for "rows after this key" (or before, when reading
+        backwards): (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        for i, (name, desc) in enumerate(keys):
+            forward = desc == reverse
+            step = Q(**{f"{name}__{'gt' if forward else 'lt'}": values[i]})
+            for j, (prev_name, _) in enumerate(keys[:i]):
+                step &= Q(**{prev_name: values[j]})
+            condition |= step
+        return condition
+
+    def paginate(self, queryset, cursor: Optional[str] = None) -> KeysetPage:
+        keys = self._resolve(queryset.model)
+        reverse = False
+        if cursor:
+            values, reverse = decode_cursor(cursor, len(keys))
+            queryset = queryset.filter(self._after(keys, values, reverse))
+
+        order = [
+            f"{'-' if desc != reverse else ''}{name}" for name, desc in keys
+        ]
+        rows = list(queryset.order_by(*order)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        page = KeysetPage(rows=rows)
+        if not rows:
+            return page
+        first = encode_cursor([self._value(rows[0], n) for n, _ in keys], True)
+        last = encode_cursor([self._value(rows[-1], n) for n, _ in keys])
+        if reverse:
+            # we came back from a later page, so there always is a next one
+            page.next_cursor = last
+            page.previous_cursor = first if has_more else None
+        else:
+            page.next_cursor = last if has_more else None
+            page.previous_cursor = first if cursor else None
+        return page
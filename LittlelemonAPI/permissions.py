@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission
 
+from LittlelemonAPI.roles import is_delivery, is_manager
+
 
 class IsManagerUser(BasePermission):
     """
@@ -7,10 +9,8 @@ class IsManagerUser(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return (
-            request.user
-            and request.user.is_authenticated
-            and request.user.groups.filter(name="manager").exists()
+        return bool(
+            request.user and request.user.is_authenticated and is_manager(request)
         )
 
 
@@ -20,8 +20,6 @@ class IsDeliveryUser(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return (
-            request.user
-            and request.user.is_authenticated
-            and request.user.groups.filter(name="delivery").exists()
+        return bool(
+            request.user and request.user.is_authenticated and is_delivery(request)
         )
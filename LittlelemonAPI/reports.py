@@ -0,0 +1,97 @@
+"""
+Sales reports for managers.
+
+Sales figures are GROUP BY queries over the daily rollups kept by
+sales.py (DailySales, DailyOrderTotals), so a report over a year reads
+a row per day (and menu item), not every order. Orders per crew isn't
+in the rollups and still groups the orders in the range. Results are
+cached per report and range for REPORT_CACHE_TIMEOUT seconds; ranges
+that include today can lag new orders by that much.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncWeek
+
+from LittlelemonAPI.models import DailyOrderTotals, DailySales, Order
+
+REPORT_KEY_PREFIX = "littlelemon:report"
+
+PERIODS = {"day": TruncDay, "week": TruncWeek}
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def get_or_set_report(name: str, params: dict, build):
+    """
+    Return the cached result of report `name` for `params`, calling
+    `build()` to produce (and store) it on a miss.
+    """
+    raw = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    key = f"{REPORT_KEY_PREFIX}:{name}:{hashlib.sha1(raw.encode()).hexdigest()}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=settings.REPORT_CACHE_TIMEOUT)
+    return data
+
+
+def _in_range(model, date_from, date_to):
+    return model.objects.filter(date__gte=date_from, date__lte=date_to)
+
+
+def revenue_by_period(date_from, date_to, period: str = "day") -> list:
+    """
+    Orders and revenue per day, or per week (starting Monday).
+    """
+    return list(
+        _in_range(DailyOrderTotals, date_from, date_to)
+        .annotate(period=PERIODS[period]("date"))
+        .values("period")
+        .annotate(orders=Sum("orders"), revenue=Sum("revenue", output_field=MONEY))
+        .order_by("period")
+    )
+
+
+def top_menu_items(date_from, date_to, limit: int) -> list:
+    """
+    The `limit` best selling menu items by quantity sold.
+    """
+    return list(
+        _in_range(DailySales, date_from, date_to)
+        .values("menuitem", "menuitem__title")
+        .annotate(
+            quantity=Sum("quantity"),
+            revenue=Sum("revenue", output_field=MONEY),
+            # an order has one date and one line per item: no double counting
+            orders=Sum("order_count"),
+        )
+        .order_by("-quantity", "menuitem")[:limit]
+    )
+
+
+def orders_per_crew(date_from, date_to) -> list:
+    """
+    Orders per delivery crew member (None: not assigned), and how many
+    of them are still open.
+    """
+    return list(
+        _in_range(Order, date_from, date_to)
+        .values("delivery_crew", "delivery_crew__username")
+        .annotate(orders=Count("id"), open_orders=Count("id", filter=Q(status=False)))
+        .order_by("-orders", "delivery_crew")
+    )
+
+
+def average_order_value(date_from, date_to) -> dict:
+    totals = _in_range(DailyOrderTotals, date_from, date_to).aggregate(
+        orders=Coalesce(Sum("orders"), 0),
+        revenue=Coalesce(Sum("revenue", output_field=MONEY), 0, output_field=MONEY),
+    )
+    totals["average"] = (
+        totals["revenue"] / totals["orders"] if totals["orders"] else None
+    )
+    return totals
@@ -0,0 +1,76 @@
+"""
+Which roles (auth groups) the requesting user has.
+
+Permission classes, views and serializers call is_manager(request) /
+is_delivery(request) instead of each running its own
+`user.groups.filter(name=...).exists()`. The user's group names are
+loaded once and kept on the request, so a request makes at most one
+group query however many checks it goes through.
+
+With ROLE_CACHE_TIMEOUT set the names are also kept in the cache
+across requests (zero group queries when warm). signals.py drops a
+user's entry whenever their groups change; use a shared cache
+(CACHE_URL) when running more than one process.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+MANAGER = "manager"
+DELIVERY = "delivery"
+
+ROLES_KEY = "littlelemon:roles:{user_id}"
+
+
+def user_roles(user) -> frozenset:
+    """
+    The names of `user`'s groups, from the cache when enabled.
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    timeout = settings.ROLE_CACHE_TIMEOUT
+    key = ROLES_KEY.format(user_id=user.pk)
+    roles = cache.get(key) if timeout else None
+    if roles is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        if timeout:
+            cache.set(key, roles, timeout=timeout)
+    return roles
+
+
+def request_roles(request) -> frozenset:
+    """
+    The requesting user's group names, loaded once per request.
+    """
+    cached = getattr(request, "_roles", None)
+    if cached is None or cached[0] != request.user.pk:
+        cached = (request.user.pk, user_roles(request.user))
+        request._roles = cached
+    return cached[1]
+
+
+def is_manager(request) -> bool:
+    return MANAGER in request_roles(request)
+
+
+def is_delivery(request) -> bool:
+    return DELIVERY in request_roles(request)
+
+
+def invalidate_roles(user_ids) -> None:
+    """
+    Forget the cached roles of `user_ids`, now and again once the
+    transaction commits, so a request that read the old groups in
+    between can't leave them cached.
+    """
+    keys = [ROLES_KEY.format(user_id=user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def group_member_ids(group) -> list:
+    return list(User.objects.filter(groups=group).values_list("id", flat=True))
@@ -0,0 +1,151 @@
+"""
+Daily sales rollups.
+
+DailySales holds the quantity, revenue and number of orders per day and
+menu item, DailyOrderTotals the orders and revenue per day. Checkout
+adds each order to both inside its transaction and deleting an order
+takes it back out (signals.py), so the reports in reports.py read a row
+per day (and item) instead of every order.
+
+Order.in_sales_rollups says whether an order was added, so deleting an
+order made elsewhere (admin, fixtures, imports) doesn't take other
+orders' sales out of its day. Such orders, and changes that skip
+checkout and deletion (queryset .update(), raw SQL), only show in the
+reports after `manage.py rebuild_daily_sales` over the dates they
+touched.
+"""
+
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from LittlelemonAPI.models import DailyOrderTotals, DailySales, Order, OrderItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _at_least_zero(expression):
+    # an order whose lines were edited after it was added mustn't push a
+    # rollup below zero when it is deleted
+    return Greatest(expression, Value(0))
+
+
+def record_order(date, total, lines, sign: int = 1) -> None:
+    """
+    Add one order to the rollups (sign=-1 takes it back out). `lines`
+    are its (menuitem_id, quantity, line_total). A handful of queries
+    whatever the number of lines: rows are created with zeros when
+    missing, then moved by one conditional UPDATE per table, which is
+    safe against concurrent checkouts.
+    """
+    lines = [(m, q, t or 0) for m, q, t in lines]
+    if sign > 0:
+        DailySales.objects.bulk_create(
+            [DailySales(date=date, menuitem_id=m) for m, _, _ in lines],
+            ignore_conflicts=True,
+        )
+        DailyOrderTotals.objects.bulk_create(
+            [DailyOrderTotals(date=date)], ignore_conflicts=True
+        )
+    if lines:
+        quantity = Case(
+            *[When(menuitem_id=m, then=Value(sign * q)) for m, q, _ in lines],
+            output_field=IntegerField(),
+        )
+        revenue = Case(
+            *[When(menuitem_id=m, then=Value(sign * t)) for m, _, t in lines],
+            output_field=MONEY,
+        )
+        DailySales.objects.filter(
+            date=date, menuitem_id__in=[m for m, _, _ in lines]
+        ).update(
+            quantity=_at_least_zero(F("quantity") + quantity),
+            revenue=_at_least_zero(F("revenue") + revenue),
+            order_count=_at_least_zero(F("order_count") + sign),
+        )
+    DailyOrderTotals.objects.filter(date=date).update(
+        orders=_at_least_zero(F("orders") + sign),
+        revenue=_at_least_zero(F("revenue") + sign * total),
+    )
+    if sign < 0:
+        DailySales.objects.filter(date=date, order_count=0).delete()
+        DailyOrderTotals.objects.filter(date=date, orders=0).delete()
+
+
+def unrecord_order(order: Order) -> None:
+    """
+    Take an order that is about to be deleted out of the rollups, if it
+    was ever added to them.
+    """
+    # read from the table: a rebuild may have added it since it was loaded
+    if not Order.objects.filter(pk=order.pk, in_sales_rollups=True).exists():
+        return
+    lines = OrderItem.objects.filter(order=order).values_list(
+        "menuitem_id", "quantity", "line_total"
+    )
+    record_order(order.date, order.total, list(lines), sign=-1)
+
+
+def rebuild_daily_sales(date_from, date_to, chunk_days: int = 31) -> dict:
+    """
+    Recompute the rollups for date_from..date_to from the order tables,
+    `chunk_days` days per transaction, and mark those orders as added.
+    Returns {"days", "rows", "seconds"}.
+    """
+    if chunk_days < 1:
+        raise ValueError("chunk_days must be at least 1")
+    started = time.monotonic()
+    rows = days = 0
+    start = date_from
+    while start <= date_to:
+        end = min(start + datetime.timedelta(days=chunk_days - 1), date_to)
+        with transaction.atomic():
+            DailySales.objects.filter(date__gte=start, date__lte=end).delete()
+            DailyOrderTotals.objects.filter(date__gte=start, date__lte=end).delete()
+            sales = (
+                OrderItem.objects.filter(order__date__gte=start, order__date__lte=end)
+                .values("order__date", "menuitem")
+                .annotate(
+                    quantity=Sum("quantity"),
+                    revenue=Coalesce(Sum("line_total"), 0, output_field=MONEY),
+                    order_count=Count("order", distinct=True),
+                )
+            )
+            created = DailySales.objects.bulk_create(
+                DailySales(
+                    date=row["order__date"],
+                    menuitem_id=row["menuitem"],
+                    quantity=row["quantity"],
+                    revenue=row["revenue"],
+                    order_count=row["order_count"],
+                )
+                for row in sales
+            )
+            orders = Order.objects.filter(date__gte=start, date__lte=end)
+            orders.filter(in_sales_rollups=False).update(in_sales_rollups=True)
+            totals = (
+                orders.values("date")
+                .annotate(orders=Count("id"), revenue=Sum("total"))
+            )
+            DailyOrderTotals.objects.bulk_create(
+                DailyOrderTotals(
+                    date=row["date"], orders=row["orders"], revenue=row["revenue"]
+                )
+                for row in totals
+            )
+        rows += len(created)
+        days += (end - start).days + 1
+        start = end + datetime.timedelta(days=1)
+    return {"days": days, "rows": rows, "seconds": time.monotonic() - started}
@@ -0,0 +1,199 @@
+"""
+Full-text search over menu item titles.
+
+SQLite: an external-content FTS5 table kept in sync with the menu item
+table by triggers. PostgreSQL: a GIN index on to_tsvector(title).
+Anything else (or a SQLite build without FTS5) falls back to the old
+title__icontains scan. `search_menu_items` hides which one is in use.
+"""
+
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, FloatField, Lookup
+from django.db.models.expressions import RawSQL
+
+from LittlelemonAPI.models import MenuItemSearch
+
+MENUITEM_TABLE = "LittlelemonAPI_menuitem"
+FTS_TABLE = "LittlelemonAPI_menuitem_fts"
+PG_INDEX = "littlelemon_menuitem_title_fts"
+PG_CONFIG = "simple"  # no stemming, titles are short names like "ice-cream"
+
+# more terms than this in one search is not a real query
+MAX_TERMS = 8
+
+SQLITE_SETUP = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        title, content='{MENUITEM_TABLE}', content_rowid='id', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ai" AFTER INSERT ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ad" AFTER DELETE ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title)
+        VALUES ('delete', old.id, old.title);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_au"
+    AFTER UPDATE OF title ON "{MENUITEM_TABLE}"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title)
+        VALUES ('delete', old.id, old.title);
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END
+    """,
+]
+
+PG_SETUP = [
+    f"""
+    CREATE INDEX IF NOT EXISTS "{PG_INDEX}" ON "{MENUITEM_TABLE}"
+    USING GIN (to_tsvector('{PG_CONFIG}', title))
+    """,
+]
+
+REBUILD_SQL = f"""INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES ('rebuild')"""
+
+# alias -> backend name, see search_backend()
+_backends = {}
+
+
+@MenuItemSearch._meta.get_field("title").register_lookup
+class Match(Lookup):
+    """
+    `search_index__title__match="..."` -> FTS5 `MATCH`
+    """
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+def _sqlite_triggers_present(cursor) -> bool:
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+        [f"{FTS_TABLE}_%"],
+    )
+    return cursor.fetchone()[0] == 3
+
+
+def install_search_index(connection) -> None:
+    """
+    Create the search index if it's missing. Safe to call repeatedly.
+
+    SQLite drops triggers whenever Django rebuilds the menu item table
+    during a migration, so this also runs after every migrate and
+    re-indexes when it finds the triggers gone.
+    """
+    _backends.pop(connection.alias, None)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                if _sqlite_triggers_present(cursor):
+                    return
+                for statement in SQLITE_SETUP:
+                    cursor.execute(statement)
+            except DatabaseError:
+                return  # sqlite built without FTS5, search uses icontains
+            cursor.execute(REBUILD_SQL)
+        elif connection.vendor == "postgresql":
+            for statement in PG_SETUP:
+                cursor.execute(statement)
+
+
+def rebuild_search_index(using: str = "default") -> str:
+    """
+    Rebuild the index from the menu item table. Returns the backend used.
+    """
+    connection = connections[using]
+    install_search_index(connection)
+    backend = search_backend(using)
+    with connection.cursor() as cursor:
+        if backend == "fts5":
+            cursor.execute(REBUILD_SQL)
+        elif backend == "postgresql":
+            cursor.execute(f'REINDEX INDEX "{PG_INDEX}"')
+    return backend
+
+
+def search_backend(using: str = "default") -> str:
+    """
+    "fts5", "postgresql" or "icontains", checked once per connection.
+    """
+    if using in _backends:
+        return _backends[using]
+    connection = connections[using]
+    backend = "icontains"
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            if cursor.fetchone():
+                backend = "fts5"
+    elif connection.vendor == "postgresql":
+        backend = "postgresql"
+    _backends[using] = backend
+    return backend
+
+
+def search_terms(text: str):
+    return re.findall(r"\w+", text.lower())[:MAX_TERMS]
+
+
+def search_menu_items(queryset, text: str, rank: bool = True):
+    """
+    Filter a MenuItem queryset to titles matching every word of `text`,
+    each word as a prefix ("piz marg" finds "Pizza Margherita").
+    With rank=True the queryset is also annotated with `search_rank`
+    (higher is a better match) and ordered by it.
+    """
+    terms = search_terms(text)
+    backend = search_backend(queryset.db)
+    if not terms or backend == "icontains":
+        return queryset.filter(title__icontains=text)
+
+    if backend == "fts5":
+        match = " ".join(f'"{term}"*' for term in terms)
+        # joins the FTS table, so sqlite drives the query from the index
+        queryset = queryset.filter(search_index__title__match=match)
+        if rank:
+            # bm25() is "lower is better", flip it so both backends agree
+            queryset = queryset.annotate(
+                search_rank=RawSQL(
+                    f'-bm25("{FTS_TABLE}")', [], output_field=FloatField()
+                )
+            )
+    else:
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        vector = f"""to_tsvector('{PG_CONFIG}', "{MENUITEM_TABLE}"."title")"""
+        queryset = queryset.filter(
+            RawSQL(
+                f"{vector} @@ to_tsquery('{PG_CONFIG}', %s)",
+                [tsquery],
+                output_field=BooleanField(),
+            )
+        )
+        if rank:
+            queryset = queryset.annotate(
+                search_rank=RawSQL(
+                    f"ts_rank({vector}, to_tsquery('{PG_CONFIG}', %s))",
+                    [tsquery],
+                    output_field=FloatField(),
+                )
+            )
+    if rank:
+        queryset = queryset.order_by("-search_rank", "id")
+    return queryset
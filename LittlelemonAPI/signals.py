@@ -0,0 +1,172 @@
+from django.db import connections
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from LittlelemonAPI.cache import bump_menu_version
+from LittlelemonAPI.models import CartItem, Category, MenuItem, Order
+from LittlelemonAPI.roles import group_member_ids, invalidate_roles
+from LittlelemonAPI.sales import unrecord_order
+from LittlelemonAPI.search import install_search_index
+from LittlelemonAPI.tax import (
+    invalidate_tax_rates,
+    price_with_tax,
+    reprice_category,
+    tax_rate_for,
+)
+from LittlelemonAPI.workload import (
+    DELIVERY_GROUP,
+    add_crew,
+    is_delivery_group,
+    move_open_order,
+    open_crew_id,
+    remove_crew,
+)
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=MenuItem)
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=CartItem)
+def stamp_raw_saves(sender, instance, raw, **kwargs):
+    # loaddata (raw) saves skip auto_now / auto_now_add, and the shipped
+    # fixtures predate the timestamp columns
+    if not raw:
+        return
+    now = timezone.now()
+    for field in instance._meta.concrete_fields:
+        auto = getattr(field, "auto_now", False) or getattr(
+            field, "auto_now_add", False
+        )
+        if auto and getattr(instance, field.attname) is None:
+            setattr(instance, field.attname, now)
+
+
+@receiver(pre_save, sender=MenuItem)
+def set_price_after_tax(sender, instance, **kwargs):
+    # also runs for loaddata (raw) saves, unlike Model.save()
+    rate = tax_rate_for(instance.category_id)
+    instance.price_after_tax = price_with_tax(instance.price, rate)
+
+
+# connected before invalidate_menu_cache so the version bump comes after
+# the repriced rows are written
+@receiver(post_save, sender=Category)
+def reprice_menu_items(sender, instance, created, **kwargs):
+    invalidate_tax_rates()
+    if not created:
+        reprice_category(instance.id)
+
+
+@receiver(post_delete, sender=Category)
+def forget_tax_rate(sender, **kwargs):
+    invalidate_tax_rates()
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_menu_cache(sender, **kwargs):
+    """
+    Any change to the menu makes every cached menu page stale.
+    """
+    bump_menu_version()
+
+
+@receiver(pre_save, sender=Order)
+def remember_open_crew(sender, instance, **kwargs):
+    """
+    Note which crew the order counted against before this save.
+    """
+    instance._open_crew_before = None
+    if instance.pk is not None:
+        before = (
+            Order.objects.filter(pk=instance.pk)
+            .values_list("delivery_crew_id", "status")
+            .first()
+        )
+        if before is not None:
+            instance._open_crew_before = open_crew_id(*before)
+
+
+@receiver(post_save, sender=Order)
+def update_crew_workload(sender, instance, **kwargs):
+    move_open_order(
+        getattr(instance, "_open_crew_before", None),
+        open_crew_id(instance.delivery_crew_id, instance.status),
+    )
+
+
+@receiver(post_delete, sender=Order)
+def release_crew_workload(sender, instance, **kwargs):
+    move_open_order(open_crew_id(instance.delivery_crew_id, instance.status), None)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_sales(sender, instance, **kwargs):
+    # pre_delete: the order's lines are still there to subtract
+    unrecord_order(instance)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def track_delivery_crew(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Add/remove workload rows as users join or leave the delivery group,
+    from either side of the relation (user.groups or group.user_set).
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:  # user.groups.add(...)
+        if action == "post_clear":
+            remove_crew([instance.pk])
+        elif is_delivery_group(pk_set):
+            (add_crew if action == "post_add" else remove_crew)([instance.pk])
+    elif isinstance(instance, Group) and instance.name == DELIVERY_GROUP:
+        if action == "post_clear":
+            remove_crew()
+        else:
+            (add_crew if action == "post_add" else remove_crew)(list(pk_set))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached roles of users whose groups changed.
+    """
+    if not reverse:  # user.groups.add(...)
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate_roles([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        invalidate_roles(pk_set)
+    elif action == "pre_clear":  # group.user_set.clear(), members unknown after
+        invalidate_roles(group_member_ids(instance))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_renamed_group_roles(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_roles(group_member_ids(instance))
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group_roles(sender, instance, **kwargs):
+    invalidate_roles(group_member_ids(instance))
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, app_config, using="default", **kwargs):
+    """
+    Migrations that rebuild the menu item table on SQLite drop the FTS
+    triggers with it, put them back.
+    """
+    if app_config.label == "LittlelemonAPI":
+        install_search_index(connections[using])
@@ -0,0 +1,77 @@
+"""
+Sales tax for menu items.
+
+Each category may carry its own rate, otherwise DEFAULT_TAX_RATE applies.
+The taxed price is stored on MenuItem.price_after_tax whenever an item is
+saved (and recomputed when a category's rate changes), so list endpoints
+just read a column instead of doing the math per row.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+TAX_RATES_KEY = "littlelemon:tax:rates"
+CENTS = Decimal("0.01")
+
+
+def default_tax_rate() -> Decimal:
+    return Decimal(str(settings.DEFAULT_TAX_RATE))
+
+
+def price_with_tax(price, rate: Decimal) -> Decimal:
+    # exact decimal math, half up like a till would round
+    return (Decimal(str(price)) * (1 + rate)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def get_tax_rates() -> Dict[int, Decimal]:
+    """
+    {category_id: rate} for categories that override the default,
+    loaded once and kept in the cache until a category changes.
+    """
+    rates = cache.get(TAX_RATES_KEY)
+    if rates is None:
+        from LittlelemonAPI.models import Category
+
+        rates = dict(
+            Category.objects.exclude(tax_rate=None).values_list("id", "tax_rate")
+        )
+        cache.set(TAX_RATES_KEY, rates, timeout=None)
+    return rates
+
+
+def invalidate_tax_rates() -> None:
+    cache.delete(TAX_RATES_KEY)
+
+
+def tax_rate_for(category_id: Optional[int]) -> Decimal:
+    rate = get_tax_rates().get(category_id)
+    return default_tax_rate() if rate is None else rate
+
+
+def reprice_category(category_id: int) -> int:
+    """
+    Recompute price_after_tax for every item in a category, writing only
+    the rows that changed. Returns how many were updated.
+    """
+    from django.utils import timezone
+
+    from LittlelemonAPI.models import MenuItem
+
+    rate = tax_rate_for(category_id)
+    now = timezone.now()
+    changed = []
+    for item in MenuItem.objects.filter(category_id=category_id).only(
+        "id", "price", "price_after_tax"
+    ):
+        taxed = price_with_tax(item.price, rate)
+        if taxed != item.price_after_tax:
+            item.price_after_tax = taxed
+            item.updated_at = now  # bulk_update skips auto_now
+            changed.append(item)
+    MenuItem.objects.bulk_update(
+        changed, ["price_after_tax", "updated_at"], batch_size=500
+    )
+    return len(changed)
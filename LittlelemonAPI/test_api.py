@@ -1,14 +1,58 @@
+import csv
+import datetime
+import io
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from LittlelemonAPI.models import CartItem, Category, MenuItem, Order
+from LittlelemonAPI.models import (
+    CartItem,
+    Category,
+    CheckoutJob,
+    DailyOrderTotals,
+    DailySales,
+    DeliveryWorkload,
+    IdempotencyKey,
+    FeaturedSchedule,
+    MenuItem,
+    Order,
+    OrderItem,
+)
+from LittlelemonAPI.cache import get_menu_version
+from LittlelemonAPI.cart_store import CacheCartBackend, fold_cart_operations
+from LittlelemonAPI.checkout import OutOfStock, place_order
+from LittlelemonAPI.ordering import MENU_ORDERINGS
+from LittlelemonAPI.utils import get_best_delivery_person
+from LittlelemonAPI.sales import rebuild_daily_sales
+from LittlelemonAPI.serializers import (
+    MenuItemSerializer,
+    OrderSerializer,
+    menu_item_values,
+    order_values,
+)
+from rest_framework.renderers import JSONRenderer
 
 from rest_framework import status
 
 
 class APITestSetupMixin:
     def setUp(self):
+        # the cache outlives each test's db transaction
+        cache.clear()
         # Create groups
         self.manager_group, _ = Group.objects.get_or_create(name="manager")
         self.delivery_group, _ = Group.objects.get_or_create(name="delivery")
@@ -108,6 +152,439 @@ class TestMenuItemsEndpoints(APITestSetupMixin, APITestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+class TestMenuItemsCache(APITestSetupMixin, APITestCase):
+    def test_second_get_is_served_from_cache(self):
+        url = reverse("menu-item-list")
+        self.client.get(url, {"perpage": 5})
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, {"perpage": 5})
+        self.assertEqual(resp.data[0]["title"], "Pizza")
+
+        self.client.force_authenticate(self.manager)
+        stats = self.client.get(reverse("menu-cache-stats")).data
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_menu_write_invalidates_cached_pages(self):
+        url = reverse("menu-item-list")
+        self.client.get(url, {"perpage": 5})
+        self.menu_item.title = "Calzone"
+        self.menu_item.save()
+        resp = self.client.get(url, {"perpage": 5})
+        self.assertEqual(resp.data[0]["title"], "Calzone")
+
+        self.category.title = "Mains"
+        self.category.save()
+        resp = self.client.get(url, {"perpage": 5})
+        self.assertEqual(resp.data[0]["category"]["title"], "Mains")
+
+    def test_cache_stats_manager_only(self):
+        self.client.force_authenticate(self.user)
+        resp = self.client.get(reverse("menu-cache-stats"))
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestMenuItemsCursorPagination(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        for i, price in enumerate([5, 7, 7, 9, 11]):
+            MenuItem.objects.create(
+                title=f"Dish {i}", price=price, category=self.category
+            )
+        self.url = reverse("menu-item-list")
+
+    def walk(self, params):
+        titles, cursor, pages = [], "", []
+        while cursor is not None:
+            resp = self.client.get(self.url, {**params, "cursor": cursor})
+            self.assertEqual(resp.status_code, 200)
+            pages.append(resp.data)
+            titles += [item["title"] for item in resp.data["results"]]
+            cursor = resp.data["next"]
+        return titles, pages
+
+    def test_cursor_walks_every_item_once_in_order(self):
+        titles, pages = self.walk({"perpage": 2, "ordering": "-price"})
+        expected = list(
+            MenuItem.objects.order_by("-price", "-id").values_list("title", flat=True)
+        )
+        self.assertEqual(titles, expected)
+        self.assertIsNone(pages[0]["previous"])
+
+    def test_previous_cursor_returns_the_page_before(self):
+        _, pages = self.walk({"perpage": 2, "ordering": "price"})
+        resp = self.client.get(
+            self.url,
+            {"perpage": 2, "ordering": "price", "cursor": pages[2]["previous"]},
+        )
+        self.assertEqual(resp.data["results"], pages[1]["results"])
+
+    def test_perpage_is_capped(self):
+        with self.settings(MAX_PAGE_SIZE=3):
+            resp = self.client.get(self.url, {"perpage": 100000, "cursor": ""})
+        self.assertEqual(len(resp.data["results"]), 3)
+
+    def test_bad_cursor_is_rejected(self):
+        resp = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_page_mode_still_returns_a_list(self):
+        resp = self.client.get(self.url, {"perpage": 2, "page": 2})
+        self.assertEqual(len(resp.data), 2)
+
+
+class TestMenuItemsSearch(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        for title in ["Pizza Margherita", "Lemon Cake", "Lemon Chicken", "Salad"]:
+            MenuItem.objects.create(title=title, price=8, category=self.category)
+        self.url = reverse("menu-item-list")
+
+    def search(self, text):
+        resp = self.client.get(self.url, {"search": text, "perpage": 10})
+        self.assertEqual(resp.status_code, 200)
+        return sorted(item["title"] for item in resp.data)
+
+    def test_prefix_search_matches_every_word(self):
+        self.assertEqual(self.search("lem"), ["Lemon Cake", "Lemon Chicken"])
+        self.assertEqual(self.search("lemon chi"), ["Lemon Chicken"])
+        self.assertEqual(self.search("piz marg"), ["Pizza Margherita"])
+
+    def test_index_follows_title_changes_and_deletes(self):
+        salad = MenuItem.objects.get(title="Salad")
+        salad.title = "Lemon Salad"
+        salad.save()
+        self.assertIn("Lemon Salad", self.search("lemon"))
+        salad.delete()
+        self.assertNotIn("Lemon Salad", self.search("lemon"))
+
+    def test_query_syntax_is_not_passed_through(self):
+        self.assertEqual(self.search('"lemon*('), ["Lemon Cake", "Lemon Chicken"])
+
+
+class TestMenuItemsOrdering(APITestSetupMixin, APITestCase):
+    def test_unknown_and_mixed_orderings_are_rejected(self):
+        url = reverse("menu-item-list")
+        for ordering in [
+            "inventory",
+            "category__title",
+            "price,-id",
+            "-category,price",
+        ]:
+            resp = self.client.get(url, {"ordering": ordering})
+            self.assertEqual(resp.status_code, 400, ordering)
+
+    def test_registered_orderings_are_accepted(self):
+        url = reverse("menu-item-list")
+        for key in MENU_ORDERINGS:
+            resp = self.client.get(url, {"ordering": key})
+            self.assertEqual(resp.status_code, 200, key)
+            descending = ",".join(f"-{term}" for term in key.split(","))
+            resp = self.client.get(url, {"ordering": descending})
+            self.assertEqual(resp.status_code, 200, descending)
+
+    def test_every_ordering_matches_its_index(self):
+        indexes = {index.name: index for index in MenuItem._meta.indexes}
+        for key, ordering in MENU_ORDERINGS.items():
+            if ordering.index is None:
+                continue
+            index_fields = [
+                MenuItem._meta.get_field(name).attname
+                for name in indexes[ordering.index].fields
+            ]
+            self.assertEqual(list(ordering.fields), index_fields, key)
+
+    def test_orderings_do_not_need_a_sort(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plan check is sqlite specific")
+        for key, ordering in MENU_ORDERINGS.items():
+            for fields in (ordering.fields, [f"-{f}" for f in ordering.fields]):
+                sql, params = MenuItem.objects.order_by(*fields)[
+                    :10
+                ].query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                    plan = " ".join(str(row) for row in cursor.fetchall())
+                self.assertNotIn("TEMP B-TREE", plan, key)
+
+
+class TestMenuItemTax(APITestSetupMixin, APITestCase):
+    def test_price_after_tax_is_stored_with_default_rate(self):
+        self.menu_item.refresh_from_db()
+        self.assertEqual(str(self.menu_item.price_after_tax), "13.75")
+        resp = self.client.get(
+            reverse("menu-item-detail", kwargs={"pk": self.menu_item.id})
+        )
+        self.assertEqual(resp.data["price_after_tax"], "13.75")
+
+    def test_rounds_half_up_on_exact_decimals(self):
+        # 12.35 * 1.1 == 13.585 exactly
+        item = MenuItem.objects.create(
+            title="Soup", price="12.35", category=self.category
+        )
+        item.refresh_from_db()
+        self.assertEqual(str(item.price_after_tax), "13.59")
+
+    def test_category_rate_change_reprices_its_items(self):
+        self.client.force_authenticate(self.manager)
+        url = reverse("categories-detail", kwargs={"pk": self.category.id})
+        resp = self.client.patch(url, {"tax_rate": "0.05"})
+        self.assertEqual(resp.status_code, 200)
+        self.menu_item.refresh_from_db()
+        self.assertEqual(str(self.menu_item.price_after_tax), "13.13")
+        # and new items in the category pick the rate up too
+        item = MenuItem.objects.create(title="Soup", price=10, category=self.category)
+        item.refresh_from_db()
+        self.assertEqual(str(item.price_after_tax), "10.50")
+
+
+class TestValuesSerializerParity(APITestSetupMixin, APITestCase):
+    def test_menu_items_match_model_serializer_bytes(self):
+        taxed = Category.objects.create(title="Taxed", slug="taxed", tax_rate="0.0725")
+        MenuItem.objects.create(title="No stock info", price="3.10", category=taxed)
+        MenuItem.objects.create(
+            title="Odd price", price="1234.57", inventory=0, category=taxed
+        )
+        items = MenuItem.objects.order_by("id")
+        slow = MenuItemSerializer(items.select_related("category"), many=True).data
+        fast = menu_item_values.serialize(menu_item_values.values(items))
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_orders_match_model_serializer_bytes(self):
+        Order.objects.create(user=self.user, total="10.50", date="2024-01-01")
+        Order.objects.create(
+            user=self.user,
+            total=7,
+            date="2024-02-29",
+            status=True,
+            delivery_crew=self.delivery,
+        )
+        orders = Order.objects.order_by("id")
+        slow = OrderSerializer(orders, many=True).data
+        fast = order_values.serialize(order_values.values(orders))
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+
+class TestConditionalGet(APITestSetupMixin, APITestCase):
+    def assert_revalidates(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        return etag
+
+    def test_menu_items_list(self):
+        url = reverse("menu-item-list")
+        etag = self.assert_revalidates(url)
+        # answered from the versions alone, even with the page not cached
+        with mock.patch("LittlelemonAPI.views.menu.get_or_set_menu_page") as page:
+            with self.assertNumQueries(0):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        page.assert_not_called()
+        MenuItem.objects.create(title="Soup", price=5, category=self.category)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_single_item_skips_serializer_on_304(self):
+        url = reverse("menu-item-detail", kwargs={"pk": self.menu_item.id})
+        etag = self.assert_revalidates(url)
+        with self.assertNumQueries(1):
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        # renaming the category changes the nested body, so the etag too
+        self.category.title = "Mains"
+        self.category.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_categories(self):
+        self.assert_revalidates(reverse("categories-list"))
+        self.assert_revalidates(
+            reverse("categories-detail", kwargs={"pk": self.category.id})
+        )
+
+    def test_order_detail(self):
+        order = Order.objects.create(user=self.user, total=10, date="2024-01-01")
+        url = reverse("order-detail", kwargs={"pk": order.id})
+        self.client.force_authenticate(self.user)
+        etag = self.assert_revalidates(url)
+        order.status = True
+        order.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        # no 304 (or etag) for someone who can't see the order
+        self.client.force_authenticate(self.delivery)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestFeaturedItem(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("featured")
+        self.soup = MenuItem.objects.create(
+            title="Soup", price=5, category=self.category
+        )
+
+    def test_warm_get_does_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.data["title"], "Pizza")
+
+    def test_switch_updates_only_old_and_new_rows(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(self.admin)
+        resp = self.client.post(self.url, {"item_id": self.soup.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            list(
+                MenuItem.objects.filter(featured=True).values_list("title", flat=True)
+            ),
+            ["Soup"],
+        )
+        # the cached read was dropped by the switch
+        self.assertEqual(self.client.get(self.url).data["title"], "Soup")
+
+    def test_featured_flag_through_the_serializer_moves_it(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("menu-item-detail", kwargs={"pk": self.soup.id})
+        resp = self.client.patch(url, {"featured": True})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(MenuItem.objects.filter(featured=True).count(), 1)
+
+    def test_failed_featured_save_keeps_the_old_one(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("menu-item-detail", kwargs={"pk": self.soup.id})
+        with mock.patch.object(MenuItem, "save", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.client.patch(url, {"featured": True})
+        self.assertEqual(
+            list(
+                MenuItem.objects.filter(featured=True).values_list("title", flat=True)
+            ),
+            ["Pizza"],
+        )
+
+    def test_scheduled_switch_applies_after_start(self):
+        starts_at = timezone.now() + datetime.timedelta(hours=1)
+        self.client.force_authenticate(self.admin)
+        resp = self.client.post(
+            self.url, {"item_id": self.soup.id, "starts_at": starts_at.isoformat()}
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.client.get(self.url).data["title"], "Pizza")
+
+        later = starts_at + datetime.timedelta(minutes=1)
+        with mock.patch("LittlelemonAPI.featured.timezone.now", return_value=later):
+            self.assertEqual(self.client.get(self.url).data["title"], "Soup")
+        self.assertTrue(FeaturedSchedule.objects.get().applied)
+
+
+class TestMenuItemsBulk(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("menu-item-bulk")
+        self.client.force_authenticate(self.manager)
+
+    def item(self, title, price="4.00", **extra):
+        return {
+            "title": title,
+            "price": price,
+            "category_id": self.category.id,
+            **extra,
+        }
+
+    def test_creates_all_items_in_constant_queries(self):
+        payload = [self.item(f"Dish {i}") for i in range(50)]
+        with self.assertNumQueries(6):
+            resp = self.client.post(self.url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r["status"] for r in resp.data], ["created"] * 50)
+        dish = MenuItem.objects.get(title="Dish 7")
+        self.assertEqual(resp.data[7]["id"], dish.id)
+        self.assertEqual(dish.price_after_tax, Decimal("4.40"))
+
+    def test_upsert_updates_existing_titles(self):
+        payload = [self.item("Pizza", price="20.00"), self.item("Salad")]
+        resp = self.client.post(self.url + "?upsert=true", payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r["status"] for r in resp.data], ["updated", "created"])
+        self.menu_item.refresh_from_db()
+        self.assertEqual(self.menu_item.price, Decimal("20.00"))
+        self.assertEqual(self.menu_item.price_after_tax, Decimal("22.00"))
+
+    def test_errors_reject_the_whole_batch(self):
+        payload = [
+            self.item("Pizza"),
+            self.item("Soup", category_id=9999),
+            self.item("Soup"),
+        ]
+        resp = self.client.post(self.url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(resp.data["non_field_errors"]), 3)
+        self.assertFalse(MenuItem.objects.filter(title="Soup").exists())
+
+    def test_manager_only(self):
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(self.url, [self.item("Soup")], format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestMenuItemsExport(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("menu-item-export")
+        drinks = Category.objects.create(title="Drinks", slug="drinks")
+        MenuItem.objects.create(title="Lemonade", price=3, category=drinks)
+        MenuItem.objects.create(title="Pasta", price=9, category=self.category)
+        self.client.force_authenticate(self.manager)
+
+    def export(self, **params):
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return b"".join(resp.streaming_content).decode()
+
+    def test_jsonl_matches_the_list_endpoint(self):
+        lines = self.export().splitlines()
+        listed = self.client.get(reverse("menu-item-list"), {"perpage": 100}).json()
+        self.assertEqual([json.loads(line) for line in lines], listed)
+
+    def test_csv_flattens_nested_fields(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(output="csv"))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["title"], "Pizza")
+        self.assertEqual(rows[0]["category.title"], "Cat")
+        self.assertEqual(rows[0]["price_after_tax"], "13.75")
+
+    def test_same_filters_as_menu_items(self):
+        lines = self.export(category="Cat", ordering="-price").splitlines()
+        self.assertEqual(
+            [json.loads(line)["title"] for line in lines], ["Pizza", "Pasta"]
+        )
+        self.assertEqual(self.export(search="lemon").count("\n"), 1)
+
+    def test_export_media_types_are_acceptable(self):
+        for output, accept in [("csv", "text/csv"), ("jsonl", "application/x-ndjson")]:
+            resp = self.client.get(self.url, {"output": output}, HTTP_ACCEPT=accept)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp["Content-Type"], accept)
+        # the Accept header alone picks the format
+        resp = self.client.get(self.url, HTTP_ACCEPT="text/csv")
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"id,title,"))
+        resp = self.client.get(self.url, {"output": "xml"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp["Content-Type"], "application/json")
+
+    def test_unknown_output_and_non_managers_are_rejected(self):
+        self.assertEqual(self.client.get(self.url, {"output": "xml"}).status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
 class TestCategoriesEndpoints(APITestSetupMixin, APITestCase):
     """
     All sorts of tests for the categories endpoints
@@ -203,6 +680,98 @@ class TestCartAndOrderEndpoints(APITestSetupMixin, APITestCase):
         self.assertEqual(CartItem.objects.filter(user=self.user).count(), 0)
         self.assertTrue(Order.objects.filter(user=self.user).exists())
 
+    def test_checkout_copies_lines_and_totals_in_constant_queries(self):
+        soup = MenuItem.objects.create(
+            title="Soup", price="4.10", category=self.category
+        )
+        CartItem.objects.create(user=self.user, menuitem=soup, quantity=3)
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(self.checkout_url)
+        self.assertEqual(resp.status_code, 201)
+        order = Order.objects.get(id=resp.data["order_id"])
+        self.assertEqual(order.total, Decimal("37.30"))
+        self.assertEqual(
+            sorted(
+                OrderItem.objects.filter(order=order).values_list(
+                    "menuitem__title", "quantity"
+                )
+            ),
+            [("Pizza", 2), ("Soup", 3)],
+        )
+
+        def checkout_queries(lines):
+            CartItem.objects.bulk_create(
+                CartItem(user=self.user, menuitem=item, quantity=1)
+                for item in MenuItem.objects.all()[:lines]
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.post(self.checkout_url)
+            self.assertEqual(resp.status_code, 201)
+            return len(ctx.captured_queries)
+
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f"Dish {i}", price=5, category=self.category)
+            for i in range(30)
+        )
+        self.assertEqual(checkout_queries(1), checkout_queries(30))
+        self.assertEqual(
+            OrderItem.objects.filter(order=Order.objects.latest("id")).count(), 30
+        )
+
+    def test_checkout_snapshots_prices(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.get(
+            id=self.client.post(self.checkout_url).data["order_id"]
+        )
+        self.menu_item.price = 99
+        self.menu_item.save()
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(
+            list(
+                OrderItem.objects.filter(order=order).values_list(
+                    "unit_price", "line_total"
+                )
+            ),
+            [(Decimal("12.50"), Decimal("25.00"))],
+        )
+
+    def test_backfill_order_snapshots(self):
+        soup = MenuItem.objects.create(
+            title="Soup", price="4.10", category=self.category
+        )
+        order = Order.objects.create(
+            user=self.user, total="29.10", date=datetime.date.today()
+        )
+        OrderItem.objects.create(order=order, menuitem=self.menu_item, quantity=2)
+        OrderItem.objects.create(order=order, menuitem=soup, quantity=1)
+        empty = Order.objects.create(
+            user=self.user, total=0, date=datetime.date.today()
+        )
+        # as the daily sales migration does, before the lines have a line_total
+        call_command("rebuild_daily_sales", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("backfill_order_snapshots", "--batch-size", "1", stdout=out)
+        self.assertIn("Backfilled 2 order lines and 2 orders.", out.getvalue())
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list("unit_price", "line_total")),
+            [(Decimal("4.10"), Decimal("4.10")), (Decimal("12.50"), Decimal("25.00"))],
+        )
+        order.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual((order.item_count, empty.item_count), (3, 0))
+        self.assertEqual(
+            sorted(DailySales.objects.values_list("menuitem__title", "revenue")),
+            [("Pizza", Decimal("25.00")), ("Soup", Decimal("4.10"))],
+        )
+
+    def test_checkout_empty_cart(self):
+        CartItem.objects.all().delete()
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(self.checkout_url)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data, {"detail": "Your cart is empty."})
+        self.assertFalse(Order.objects.exists())
+
     def test_order_view_permissions(self):
         # Create order for user and delivery
         order = Order.objects.create(
@@ -250,6 +819,1052 @@ class TestCartAndOrderEndpoints(APITestSetupMixin, APITestCase):
         )  # status.HTTP_204_NO_CONTENT if deleted, 404 if already deleted
         
         
+class TestOrderList(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("order-list")
+        start = datetime.date(2024, 1, 1)
+        self.orders = [
+            Order.objects.create(
+                user=self.user,
+                total=10,
+                date=start + datetime.timedelta(days=i // 2),  # two orders a day
+                delivery_crew=self.delivery if i % 2 else None,
+                status=i % 3 == 0,
+            )
+            for i in range(7)
+        ]
+        self.client.force_authenticate(self.manager)
+
+    def ids(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        results = resp.data["results"] if isinstance(resp.data, dict) else resp.data
+        return [order["id"] for order in results]
+
+    def test_cursor_pages_walk_newest_first(self):
+        newest_first = [order.id for order in reversed(self.orders)]
+        seen = []
+        resp = self.client.get(self.url, {"cursor": "", "perpage": 3})
+        while True:
+            seen += self.ids(resp)
+            if resp.data["next"] is None:
+                break
+            resp = self.client.get(
+                self.url, {"cursor": resp.data["next"], "perpage": 3}
+            )
+        self.assertEqual(seen, newest_first)
+        previous = self.client.get(
+            self.url, {"cursor": resp.data["previous"], "perpage": 3}
+        )
+        self.assertEqual(self.ids(previous), newest_first[3:6])
+
+    @override_settings(MAX_PAGE_SIZE=2)
+    def test_page_size_is_capped(self):
+        self.assertEqual(len(self.ids(self.client.get(self.url, {"perpage": 500}))), 2)
+        self.assertEqual(len(self.ids(self.client.get(self.url, {"cursor": ""}))), 2)
+
+    def test_plain_list_links_to_the_next_page(self):
+        resp = self.client.get(self.url, {"perpage": 4})
+        self.assertEqual(
+            self.ids(resp), [order.id for order in reversed(self.orders[3:])]
+        )
+        next_url = resp["Link"].split(";")[0].strip("<>")
+        rest = self.client.get(next_url)
+        self.assertEqual(
+            self.ids(rest), [order.id for order in reversed(self.orders[:3])]
+        )
+        self.assertFalse(rest.has_header("Link"))
+        self.assertFalse(self.client.get(self.url).has_header("Link"))
+
+    def test_filters(self):
+        def ids(**params):
+            return sorted(self.ids(self.client.get(self.url, params)))
+
+        o = [order.id for order in self.orders]
+        self.assertEqual(ids(status="true"), [o[0], o[3], o[6]])
+        self.assertEqual(ids(date_from="2024-01-02", date_to="2024-01-03"), o[2:6])
+        self.assertEqual(
+            ids(delivery_crew=self.delivery.id, status="false"), [o[1], o[5]]
+        )
+        self.assertEqual(ids(date_from="2024-01-04", cursor=""), [o[6]])
+
+    def test_invalid_filters(self):
+        resp = self.client.get(
+            self.url, {"date_from": "2024-02-01", "date_to": "2024-01-01"}
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("date_to", resp.data)
+        resp = self.client.get(self.url, {"date_from": "yesterday"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_filters_stay_within_the_users_orders(self):
+        other = User.objects.create(username="other")
+        Order.objects.create(
+            user=other, total=5, date="2024-01-01", delivery_crew=self.delivery
+        )
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            sorted(
+                self.ids(self.client.get(self.url, {"delivery_crew": self.delivery.id}))
+            ),
+            [self.orders[i].id for i in (1, 3, 5)],
+        )
+
+
+class TestOrderLines(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dishes = MenuItem.objects.bulk_create(
+            MenuItem(title=f"Dish {i}", price=5, category=self.category)
+            for i in range(5)
+        )
+        self.client.force_authenticate(self.manager)
+
+    def make_order(self, lines):
+        order = Order.objects.create(
+            user=self.user, total=10, date="2024-01-01", item_count=lines
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, menuitem=dish, quantity=1, unit_price=5, line_total=5
+            )
+            for dish in self.dishes[:lines]
+        )
+        return order
+
+    def test_list_and_detail_show_the_same_lines(self):
+        order = self.make_order(2)
+        detail = self.client.get(reverse("order-detail", kwargs={"pk": order.id})).data
+        self.assertEqual(
+            [
+                (line["title"], line["quantity"], line["line_total"])
+                for line in detail["items"]
+            ],
+            [("Dish 0", 1, "5.00"), ("Dish 1", 1, "5.00")],
+        )
+        listed = self.client.get(reverse("order-list")).data
+        self.assertEqual(JSONRenderer().render(listed), JSONRenderer().render([detail]))
+
+    def test_detail_revalidates_when_a_line_item_changes(self):
+        order = self.make_order(2)
+        url = reverse("order-detail", kwargs={"pk": order.id})
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        dish = self.dishes[1]
+        dish.title = "Renamed"
+        dish.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [line["title"] for line in resp.data["items"]], ["Dish 0", "Renamed"]
+        )
+
+    def test_constant_queries(self):
+        def queries(url, **params):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url, params).status_code, 200)
+            return len(ctx.captured_queries)
+
+        first = self.make_order(1)
+        detail_url = reverse("order-detail", kwargs={"pk": first.id})
+        list_url = reverse("order-list")
+        one = (queries(detail_url), queries(list_url), queries(list_url, cursor=""))
+        for _ in range(5):
+            self.make_order(5)
+        big = self.make_order(5)
+        detail_url = reverse("order-detail", kwargs={"pk": big.id})
+        many = (queries(detail_url), queries(list_url), queries(list_url, cursor=""))
+        self.assertEqual(one, many)
+
+
+class TestReports(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price="3.75", category=self.category
+        )
+        # (date, total, crew, delivered, {item: quantity}); 2024-03-04 is a Monday
+        for day, total, crew, delivered, lines in [
+            (
+                "2024-03-04",
+                "20.00",
+                self.delivery,
+                True,
+                {self.menu_item: 1, self.soup: 2},
+            ),
+            ("2024-03-04", "7.50", None, False, {self.soup: 2}),
+            ("2024-03-06", "25.00", self.delivery, False, {self.menu_item: 2}),
+            ("2024-03-11", "3.75", self.delivery, False, {self.soup: 1}),
+            ("2024-02-01", "99.00", None, True, {self.menu_item: 8}),  # out of range
+        ]:
+            order = Order.objects.create(
+                user=self.user,
+                total=total,
+                date=day,
+                delivery_crew=crew,
+                status=delivered,
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    menuitem=item,
+                    quantity=quantity,
+                    unit_price=item.price,
+                    line_total=Decimal(item.price) * quantity,
+                )
+                for item, quantity in lines.items()
+            )
+        # made outside checkout, so the rollups have to be built
+        call_command("rebuild_daily_sales", "--chunk-days", "7", stdout=io.StringIO())
+        self.range = {"date_from": "2024-03-01", "date_to": "2024-03-31"}
+        self.client.force_authenticate(self.manager)
+
+    def get(self, name, **params):
+        resp = self.client.get(reverse(name), {**self.range, **params})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data["results"]
+
+    def test_revenue_by_day_and_week(self):
+        self.assertEqual(
+            [
+                (row["period"], row["orders"], row["revenue"])
+                for row in self.get("report-revenue")
+            ],
+            [
+                ("2024-03-04", 2, "27.50"),
+                ("2024-03-06", 1, "25.00"),
+                ("2024-03-11", 1, "3.75"),
+            ],
+        )
+        weeks = self.get("report-revenue", period="week")
+        self.assertEqual(
+            [(row["period"], row["orders"], row["revenue"]) for row in weeks],
+            [("2024-03-04", 3, "52.50"), ("2024-03-11", 1, "3.75")],
+        )
+
+    def test_top_items(self):
+        self.assertEqual(
+            [
+                (r["title"], r["quantity"], r["revenue"], r["orders"])
+                for r in self.get("report-top-items")
+            ],
+            [("Soup", 5, "18.75", 3), ("Pizza", 3, "37.50", 2)],
+        )
+        self.assertEqual(len(self.get("report-top-items", limit=1)), 1)
+
+    def test_orders_per_crew_and_average(self):
+        self.assertEqual(
+            [
+                (r["username"], r["orders"], r["open_orders"])
+                for r in self.get("report-crew")
+            ],
+            [("delivery", 3, 2), (None, 1, 1)],
+        )
+        self.assertEqual(
+            self.get("report-average-order-value"),
+            {"orders": 4, "revenue": "56.25", "average": "14.06"},
+        )
+
+    def test_cached_per_range(self):
+        self.get("report-top-items")
+        with CaptureQueriesContext(connection) as ctx:
+            self.get("report-top-items")
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "auth_user_groups" not in q["sql"]]
+        )
+        self.range["date_from"] = "2024-03-05"
+        self.assertEqual(self.get("report-top-items")[0]["quantity"], 2)
+
+    def test_params_and_permissions(self):
+        resp = self.client.get(reverse("report-revenue"), {"period": "month"})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(
+            reverse("report-crew"), {"date_from": "2024-04-01", "date_to": "2024-03-01"}
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse("report-revenue")).status_code, 403)
+
+
+class TestDailySales(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price="3.75", category=self.category
+        )
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, cart):
+        for item, quantity in cart.items():
+            CartItem.objects.create(user=self.user, menuitem=item, quantity=quantity)
+        resp = self.client.post(reverse("checkout"))
+        self.assertEqual(resp.status_code, 201)
+        return Order.objects.get(id=resp.data["order_id"])
+
+    def rollups(self):
+        return (
+            sorted(
+                DailySales.objects.values_list(
+                    "menuitem__title", "quantity", "revenue", "order_count"
+                )
+            ),
+            list(DailyOrderTotals.objects.values_list("orders", "revenue")),
+        )
+
+    def test_checkout_and_deletion_keep_rollups_in_step(self):
+        self.checkout({self.menu_item: 1, self.soup: 2})
+        second = self.checkout({self.soup: 1})
+        expected = (
+            [("Pizza", 1, Decimal("12.50"), 1), ("Soup", 3, Decimal("11.25"), 2)],
+            [(2, Decimal("23.75"))],
+        )
+        self.assertEqual(self.rollups(), expected)
+
+        call_command("rebuild_daily_sales", stdout=io.StringIO())
+        self.assertEqual(self.rollups(), expected)
+
+        second.delete()
+        self.assertEqual(
+            self.rollups(),
+            (
+                [("Pizza", 1, Decimal("12.50"), 1), ("Soup", 2, Decimal("7.50"), 1)],
+                [(1, Decimal("20.00"))],
+            ),
+        )
+        Order.objects.all().delete()
+        self.assertEqual(self.rollups(), ([], []))
+
+    def test_rebuild_rejects_empty_chunks(self):
+        self.checkout({self.soup: 1})
+        for days in ("0", "-3"):
+            with self.assertRaises(CommandError):
+                call_command(
+                    "rebuild_daily_sales", "--chunk-days", days, stdout=io.StringIO()
+                )
+        with self.assertRaises(ValueError):
+            rebuild_daily_sales(
+                datetime.date.today(), datetime.date.today(), chunk_days=0
+            )
+
+    def test_orders_made_outside_checkout_do_not_break_deletion(self):
+        self.checkout({self.soup: 1})
+        counted = ([("Soup", 1, Decimal("3.75"), 1)], [(1, Decimal("3.75"))])
+        order = Order.objects.create(
+            user=self.user, total=50, date=datetime.date.today()
+        )
+        OrderItem.objects.create(
+            order=order, menuitem=self.soup, quantity=4, line_total=15
+        )
+        order.delete()  # was never added, the checkout's sales stay
+        self.assertEqual(self.rollups(), counted)
+
+        order = Order.objects.create(
+            user=self.user, total=15, date=datetime.date.today()
+        )
+        OrderItem.objects.create(
+            order=order, menuitem=self.soup, quantity=4, line_total=15
+        )
+        call_command("rebuild_daily_sales", stdout=io.StringIO())
+        self.assertEqual(
+            self.rollups(),
+            ([("Soup", 5, Decimal("18.75"), 2)], [(2, Decimal("18.75"))]),
+        )
+        order.delete()  # added by the rebuild, so taken back out
+        self.assertEqual(self.rollups(), counted)
+
+    def test_rebuild_clears_rollups_of_dates_without_orders(self):
+        self.checkout({self.soup: 1})
+        Order.objects.update(date="2024-01-01")  # behind the rollups' back
+        call_command("rebuild_daily_sales", stdout=io.StringIO())
+        self.assertEqual(
+            list(DailyOrderTotals.objects.values_list("date", "orders")),
+            [(datetime.date(2024, 1, 1), 1)],
+        )
+
+    def test_reports_read_the_rollups(self):
+        self.checkout({self.soup: 2})
+        OrderItem.objects.all().delete()  # behind the rollups' back
+        self.client.force_authenticate(self.manager)
+        resp = self.client.get(reverse("report-top-items"))
+        self.assertEqual(
+            [(r["title"], r["quantity"]) for r in resp.data["results"]], [("Soup", 2)]
+        )
+
+
+class TestRoleResolution(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.user, total=10, date="2024-01-01")
+        self.order_url = reverse("order-detail", kwargs={"pk": self.order.id})
+
+    def group_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = getattr(self.client, method)(url, data, format="json")
+        return resp, sum("auth_user_groups" in q["sql"] for q in ctx.captured_queries)
+
+    def test_one_group_query_per_request(self):
+        self.client.force_authenticate(self.manager)
+        resp, queries = self.group_queries(
+            "patch", self.order_url, {"delivery_crew": self.delivery.id}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(queries, 1)
+        self.client.force_authenticate(self.delivery)
+        resp, queries = self.group_queries("patch", self.order_url, {"status": True})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(queries, 1)
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_cached_roles_follow_group_changes(self):
+        url = reverse("menu-cache-stats")
+        self.client.force_authenticate(self.manager)
+        self.client.get(url)
+        resp, queries = self.group_queries("get", url)
+        self.assertEqual((resp.status_code, queries), (200, 0))
+
+        self.manager.groups.remove(self.manager_group)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.manager_group.user_set.add(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.manager_group.user_set.clear()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.manager.groups.add(self.manager_group)
+        self.manager_group.name = "managers"
+        self.manager_group.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class TestCartBatch(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price=5, category=self.category
+        )
+        self.bread = MenuItem.objects.create(
+            title="Bread", price=3, category=self.category
+        )
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=2)
+        CartItem.objects.create(user=self.user, menuitem=self.bread, quantity=1)
+        self.url = reverse("cart-items-batch")
+        self.client.force_authenticate(self.user)
+
+    def cart(self):
+        return dict(
+            CartItem.objects.filter(user=self.user).values_list(
+                "menuitem__title", "quantity"
+            )
+        )
+
+    def test_applies_a_meal_in_constant_queries(self):
+        meal = [
+            {"menuitem": self.menu_item.id, "op": "increment", "quantity": 3},
+            {"menuitem": self.soup.id, "quantity": 2},
+            {"menuitem": self.soup.id, "op": "increment", "quantity": 1},
+            {"menuitem": self.bread.id, "op": "remove"},
+        ]
+        # items check, savepoint, delete, upsert, release, cart read
+        with self.assertNumQueries(6):
+            resp = self.client.post(self.url, meal, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(line["menuitem"], line["quantity"]) for line in resp.data],
+            [(self.menu_item.id, 5), (self.soup.id, 3)],
+        )
+        self.assertEqual(self.cart(), {"Pizza": 5, "Soup": 3})
+
+    def test_quantities_are_clamped(self):
+        ops = [
+            {"menuitem": self.menu_item.id, "op": "increment", "quantity": 40},
+            {"menuitem": self.bread.id, "op": "increment", "quantity": -5},
+        ]
+        self.client.post(self.url, ops, format="json")
+        self.assertEqual(self.cart(), {"Pizza": 40, "Bread": 0})
+
+    def test_quantities_are_clamped_after_each_step(self):
+        self.client.post(
+            self.url, [{"menuitem": self.menu_item.id, "quantity": 30}], format="json"
+        )
+        ops = [
+            # 30 -> 40 -> 20, not 30 + 20 - 20
+            {"menuitem": self.menu_item.id, "op": "increment", "quantity": 20},
+            {"menuitem": self.menu_item.id, "op": "increment", "quantity": -20},
+            # 1 -> 0 -> 5
+            {"menuitem": self.bread.id, "op": "increment", "quantity": -5},
+            {"menuitem": self.bread.id, "op": "increment", "quantity": 5},
+            # 35 -> 40 -> 30
+            {"menuitem": self.soup.id, "quantity": 35},
+            {"menuitem": self.soup.id, "op": "increment", "quantity": 10},
+            {"menuitem": self.soup.id, "op": "increment", "quantity": -10},
+        ]
+        resp = self.client.post(self.url, ops, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.cart(), {"Pizza": 20, "Bread": 5, "Soup": 30})
+
+    def test_quantities_out_of_range_reject_the_batch(self):
+        ops = [
+            {"menuitem": self.soup.id, "quantity": 1},
+            {"menuitem": self.bread.id, "quantity": 50},
+        ]
+        resp = self.client.post(self.url, ops, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.cart(), {"Pizza": 2, "Bread": 1})
+
+    def test_unknown_menu_items_reject_the_batch(self):
+        ops = [
+            {"menuitem": self.soup.id, "quantity": 1},
+            {"menuitem": 9999, "quantity": 1},
+        ]
+        resp = self.client.post(self.url, ops, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.cart(), {"Pizza": 2, "Bread": 1})
+
+    @override_settings(CART_BACKEND="LittlelemonAPI.cart_store.CacheCartBackend")
+    def test_cache_backend(self):
+        ops = [
+            {"menuitem": self.menu_item.id, "op": "increment", "quantity": 1},
+            {"menuitem": self.bread.id, "op": "remove"},
+        ]
+        resp = self.client.post(self.url, ops, format="json")
+        self.assertEqual(
+            [(line["menuitem"], line["quantity"]) for line in resp.data],
+            [(self.menu_item.id, 3)],
+        )
+
+
+class TestCartSummary(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        drinks = Category.objects.create(
+            title="Drinks", slug="drinks", tax_rate="0.2000"
+        )
+        self.lemonade = MenuItem.objects.create(
+            title="Lemonade", price="3.10", category=drinks
+        )
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            reverse("cart-items-list"), {"menuitem": self.menu_item.id, "quantity": 2}
+        )
+        self.client.post(
+            reverse("cart-items-list"), {"menuitem": self.lemonade.id, "quantity": 3}
+        )
+        self.url = reverse("cart-items-summary")
+
+    def test_totals_use_the_menu_tax_rules(self):
+        summary = self.client.get(self.url).data
+        self.assertEqual(summary["line_count"], 2)
+        self.assertEqual(summary["quantity"], 5)
+        self.assertEqual(summary["subtotal"], "34.30")  # 2 x 12.50 + 3 x 3.10
+        self.assertEqual(summary["tax"], "4.36")  # 2 x 1.25 + 3 x 0.62
+        self.assertEqual(summary["total"], "38.66")
+        self.assertEqual(
+            [(line["title"], line["line_total"]) for line in summary["lines"]],
+            [("Pizza", "25.00"), ("Lemonade", "9.30")],
+        )
+
+    def test_one_query_when_not_cached(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            summary = self.client.get(self.url).data
+        self.assertEqual((summary["line_count"], summary["total"]), (2, "38.66"))
+        CartItem.objects.all().delete()
+        cache.clear()
+        summary = self.client.get(self.url).data
+        self.assertEqual(
+            (
+                summary["line_count"],
+                summary["quantity"],
+                summary["tax"],
+                summary["lines"],
+            ),
+            (0, 0, "0.00", []),
+        )
+
+    def test_cached_until_the_cart_or_menu_changes(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        batch = [{"menuitem": self.lemonade.id, "op": "remove"}]
+        self.client.post(reverse("cart-items-batch"), batch, format="json")
+        self.assertEqual(self.client.get(self.url).data["total"], "27.50")
+        self.menu_item.price = 10
+        self.menu_item.save()
+        self.assertEqual(self.client.get(self.url).data["total"], "22.00")
+
+    def test_removing_a_line_updates_the_summary(self):
+        self.client.get(self.url)
+        line = CartItem.objects.get(user=self.user, menuitem=self.lemonade)
+        resp = self.client.delete(reverse("cart-items-detail", kwargs={"pk": line.id}))
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(self.client.get(self.url).data["line_count"], 1)
+
+    def test_empty_cart(self):
+        self.client.delete(reverse("cart-items-delete"))
+        summary = self.client.get(self.url).data
+        self.assertEqual(
+            (summary["line_count"], summary["total"], summary["lines"]), (0, "0.00", [])
+        )
+
+
+class TestCartCompaction(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price="4.10", category=self.category
+        )
+        for user in (self.user, self.manager, self.delivery):
+            for item in (self.menu_item, self.soup):
+                CartItem.objects.create(user=user, menuitem=item, quantity=1)
+        self.long_ago = timezone.now() - datetime.timedelta(days=60)
+        CartItem.objects.update(updated_at=self.long_ago)
+
+    def test_deletes_only_carts_untouched_for_the_whole_period(self):
+        # the manager changed one line recently, so their whole cart stays
+        CartItem.objects.filter(user=self.manager, menuitem=self.soup).update(
+            updated_at=timezone.now()
+        )
+        out = io.StringIO()
+        call_command("compact_carts", "--days", "30", "--batch-size", "2", stdout=out)
+        self.assertEqual(
+            sorted(CartItem.objects.values_list("user__username", flat=True)),
+            ["manager", "manager"],
+        )
+        self.assertIn("Deleted 4 cart rows from 2 carts in 3 batches", out.getvalue())
+
+    def test_cart_writes_count_as_activity(self):
+        self.client.force_authenticate(self.user)
+        batch = [{"menuitem": self.soup.id, "op": "increment", "quantity": 1}]
+        self.client.post(reverse("cart-items-batch"), batch, format="json")
+        call_command("compact_carts", "--days", "30", stdout=io.StringIO())
+        self.assertEqual(
+            set(CartItem.objects.values_list("user__username", flat=True)), {"user"}
+        )
+        self.assertEqual(CartItem.objects.get(menuitem=self.soup).quantity, 2)
+
+
+@override_settings(CART_BACKEND="LittlelemonAPI.cart_store.CacheCartBackend")
+class TestCacheCartBackend(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price=5, category=self.category
+        )
+        self.cart_url = reverse("cart-items-list")
+        self.client.force_authenticate(self.user)
+
+    def test_cart_is_served_from_the_cache_until_flushed(self):
+        self.client.post(self.cart_url, {"menuitem": self.menu_item.id, "quantity": 2})
+        self.client.post(self.cart_url, {"menuitem": self.soup.id, "quantity": 1})
+        resp = self.client.post(
+            self.cart_url, {"menuitem": self.soup.id, "quantity": 1}
+        )
+        self.assertEqual(
+            resp.data, {"detail": "This menu item is already in your cart."}
+        )
+        url = reverse("cart-items-detail", kwargs={"pk": self.soup.id})
+        self.assertEqual(self.client.patch(url, {"quantity": 3}).data["quantity"], 3)
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.cart_url)
+        self.assertEqual(
+            [(line["menuitem"], line["quantity"]) for line in resp.data],
+            [(self.menu_item.id, 2), (self.soup.id, 3)],
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_carts", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(CartItem.objects.values_list("menuitem__title", "quantity")),
+            [("Pizza", 2), ("Soup", 3)],
+        )
+        self.client.delete(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_carts", stdout=io.StringIO())
+        self.assertEqual(
+            list(CartItem.objects.values_list("menuitem__title", flat=True)), ["Pizza"]
+        )
+
+    def test_changes_made_during_a_flush_are_flushed_later(self):
+        self.client.post(self.cart_url, {"menuitem": self.menu_item.id, "quantity": 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_carts", stdout=io.StringIO())
+            # after the rows were written, before they were committed
+            self.client.post(self.cart_url, {"menuitem": self.soup.id, "quantity": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_carts", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(CartItem.objects.values_list("menuitem__title", "quantity")),
+            [("Pizza", 2), ("Soup", 1)],
+        )
+
+    def test_order_items_go_through_the_cached_cart(self):
+        self.client.post(self.cart_url, {"menuitem": self.menu_item.id, "quantity": 2})
+        resp = self.client.post(
+            reverse("order-items-list"), {"menuitem": self.soup.id, "quantity": 1}
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        url = reverse("order-items-detail", kwargs={"pk": self.menu_item.id})
+        self.assertEqual(self.client.patch(url, {"quantity": 4}).data["quantity"], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_carts", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(CartItem.objects.values_list("menuitem__title", "quantity")),
+            [("Pizza", 4), ("Soup", 1)],
+        )
+
+    def test_interleaved_changes_are_not_lost(self):
+        backend = CacheCartBackend()
+        backend.items(self.user.id)  # cached, the threads only use the cache
+        load = backend._load
+
+        def slow_load(user_id):
+            cart = load(user_id)
+            time.sleep(0.05)  # the other request reads the cart meanwhile
+            return cart
+
+        add_one = fold_cart_operations(
+            [{"menuitem": self.soup.id, "op": "increment", "quantity": 1}]
+        )
+        with mock.patch.object(backend, "_load", side_effect=slow_load):
+            threads = [
+                threading.Thread(target=backend.apply, args=(self.user.id, add_one))
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(backend.get(self.user.id, self.soup.id)["quantity"], 2)
+
+    def test_checkout_persists_the_cached_cart_first(self):
+        self.client.post(self.cart_url, {"menuitem": self.soup.id, "quantity": 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("checkout"))
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(id=resp.data["order_id"])
+        self.assertEqual(order.total, Decimal("10.00"))
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get(self.cart_url).data, [])
+
+
+class TestIdempotencyKeys(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=2)
+        self.client.force_authenticate(self.user)
+
+    def test_retried_checkout_replays_the_first_response(self):
+        first = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(first.status_code, 201)
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=1)
+        with self.assertNumQueries(1):
+            retry = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        # a new key is a new checkout
+        self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="def")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        url = reverse("cart-items-list")
+        soup = MenuItem.objects.create(title="Soup", price=5, category=self.category)
+        resp = self.client.post(
+            url, {"menuitem": soup.id, "quantity": 1}, HTTP_IDEMPOTENCY_KEY="k"
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.client.post(
+            url, {"menuitem": soup.id, "quantity": 3}, HTTP_IDEMPOTENCY_KEY="k"
+        )
+        self.assertEqual(resp.status_code, 422)
+
+    def test_failed_requests_and_expired_keys_run_again(self):
+        CartItem.objects.all().delete()
+        resp = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertEqual(resp.status_code, 400)
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=1)
+        resp = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertEqual(resp.status_code, 201)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=1)
+        resp = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertNotIn("Idempotent-Replayed", resp)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_left_in_progress_is_released_after_its_lock(self):
+        self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        # as if its worker had died before answering, and rolled the order back
+        Order.objects.all().delete()
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=2)
+        now = timezone.now()
+        IdempotencyKey.objects.update(
+            status_code=None,
+            response=None,
+            locked_until=now + datetime.timedelta(seconds=30),
+        )
+        resp = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertEqual(resp.status_code, 409)
+
+        IdempotencyKey.objects.update(locked_until=now)
+        resp = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertEqual(resp.status_code, 201)
+        retry = self.client.post(reverse("checkout"), HTTP_IDEMPOTENCY_KEY="k")
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_order_patch(self):
+        order = Order.objects.create(user=self.user, total=10, date="2024-01-01")
+        url = reverse("order-detail", kwargs={"pk": order.id})
+        self.client.force_authenticate(self.manager)
+        for _ in range(2):
+            resp = self.client.patch(
+                url, {"delivery_crew": self.delivery.id}, HTTP_IDEMPOTENCY_KEY="p"
+            )
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Idempotent-Replayed"], "true")
+        self.assertEqual(
+            DeliveryWorkload.objects.get(crew=self.delivery).open_orders, 1
+        )
+
+
+class TestInventoryReservation(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(
+            title="Soup", price=5, inventory=3, category=self.category
+        )
+        self.bread = MenuItem.objects.create(
+            title="Bread", price=3, category=self.category
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, item, quantity):
+        CartItem.objects.create(user=self.user, menuitem=item, quantity=quantity)
+
+    def test_checkout_takes_ordered_quantities_off_stock(self):
+        self.add_to_cart(self.menu_item, 4)
+        self.add_to_cart(self.soup, 3)
+        self.add_to_cart(self.bread, 7)  # no inventory, not tracked
+        resp = self.client.post(reverse("checkout"))
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        stock = dict(MenuItem.objects.values_list("title", "inventory"))
+        self.assertEqual(stock, {"Pizza": 6, "Soup": 0, "Bread": None})
+
+    def test_shortage_fails_cleanly(self):
+        self.add_to_cart(self.menu_item, 2)
+        self.add_to_cart(self.soup, 4)
+        resp = self.client.post(reverse("checkout"))
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            resp.data["items"],
+            [
+                {
+                    "menuitem": self.soup.id,
+                    "title": "Soup",
+                    "available": 3,
+                    "requested": 4,
+                }
+            ],
+        )
+        # nothing was taken, ordered or removed from the cart
+        stock = dict(MenuItem.objects.values_list("title", "inventory"))
+        self.assertEqual((stock["Pizza"], stock["Soup"]), (10, 3))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+    def test_checkout_keeps_cached_menu_pages_with_live_stock(self):
+        url = reverse("menu-item-list") + "?perpage=10"
+        etag = self.client.get(url)["ETag"]
+        self.client.get(reverse("featured"))
+        version = get_menu_version()
+        self.add_to_cart(self.menu_item, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("checkout"))
+        self.assertEqual(get_menu_version(), version)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        stock = {row["title"]: row["inventory"] for row in resp.data}
+        self.assertEqual(stock, {"Pizza": 6, "Soup": 3, "Bread": None})
+        self.assertEqual(self.client.get(reverse("featured")).data["inventory"], 6)
+        with self.assertNumQueries(0):
+            self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+
+
+class TestInventoryConcurrency(TransactionTestCase):
+    """
+    Many buyers checking out the last few of an item at the same time.
+    """
+
+    buyers = 12
+    stock = 5
+
+    def test_concurrent_checkouts_never_oversell(self):
+        category = Category.objects.create(title="Cat", slug="cat")
+        item = MenuItem.objects.create(
+            title="Pie", price=4, inventory=self.stock, category=category
+        )
+        users = [User.objects.create(username=f"buyer{i}") for i in range(self.buyers)]
+        CartItem.objects.bulk_create(
+            CartItem(user=user, menuitem=item, quantity=1) for user in users
+        )
+        outcomes = []
+        barrier = threading.Barrier(self.buyers)
+
+        def buy(user):
+            try:
+                barrier.wait()
+                for _ in range(50):
+                    try:
+                        place_order(user)
+                        outcomes.append("ok")
+                        return
+                    except OutOfStock:
+                        outcomes.append("out of stock")
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)  # sqlite table locked, try again
+                outcomes.append("gave up")
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        item.refresh_from_db()
+        sold = outcomes.count("ok")
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(outcomes.count("out of stock"), self.buyers - self.stock)
+        self.assertEqual(item.inventory, 0)
+        self.assertEqual(
+            OrderItem.objects.aggregate(n=Sum("quantity"))["n"], self.stock
+        )
+
+
+class TestAsyncCheckout(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=2)
+        self.client.force_authenticate(self.user)
+
+    def run_worker(self):
+        call_command("process_checkout_jobs", "--once", stdout=io.StringIO())
+
+    def test_queued_checkout_is_placed_by_the_worker(self):
+        resp = self.client.post(reverse("checkout") + "?async=true")
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        job_url = reverse("checkout-job", kwargs={"pk": resp.data["job_id"]})
+        self.assertEqual(resp["Location"], job_url)
+        self.assertFalse(Order.objects.exists())
+        # checking out again while queued gives the same job
+        self.assertEqual(
+            self.client.post(reverse("checkout") + "?async=1").data["job_id"],
+            resp.data["job_id"],
+        )
+        self.assertEqual(self.client.get(job_url).data["status"], "pending")
+
+        self.run_worker()
+        job = self.client.get(job_url).data
+        self.assertEqual(job["status"], "done")
+        order = Order.objects.get()
+        self.assertEqual(job["order"], order.id)
+        self.assertEqual(order.total, Decimal("25.00"))
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_failed_job_reports_the_error(self):
+        resp = self.client.post(reverse("checkout") + "?async=true")
+        CartItem.objects.all().delete()
+        self.run_worker()
+        job = CheckoutJob.objects.get(id=resp.data["job_id"])
+        self.assertEqual((job.status, job.error), ("failed", "Your cart is empty."))
+
+    def test_stale_running_job_is_requeued(self):
+        job = CheckoutJob.objects.create(
+            user=self.user,
+            status="running",
+            claimed_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+
+    def test_only_owner_or_manager_can_poll(self):
+        resp = self.client.post(reverse("checkout") + "?async=true")
+        url = reverse("checkout-job", kwargs={"pk": resp.data["job_id"]})
+        self.client.force_authenticate(self.delivery)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class TestDeliveryWorkload(APITestSetupMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_driver = User.objects.create_user("driver2", password="pass")
+        self.other_driver.groups.add(self.delivery_group)
+
+    def open_orders(self):
+        return dict(
+            DeliveryWorkload.objects.values_list("crew__username", "open_orders")
+        )
+
+    def test_checkout_picks_least_loaded_crew_with_one_query(self):
+        Order.objects.create(
+            user=self.user, total=10, date="2024-01-01", delivery_crew=self.delivery
+        )
+        # delivered orders don't count
+        Order.objects.create(
+            user=self.user,
+            total=10,
+            date="2024-01-01",
+            delivery_crew=self.other_driver,
+            status=True,
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(get_best_delivery_person(), self.other_driver)
+
+        CartItem.objects.create(user=self.user, menuitem=self.menu_item, quantity=1)
+        self.client.force_authenticate(self.user)
+        resp = self.client.post(reverse("checkout"))
+        order = Order.objects.get(id=resp.data["order_id"])
+        self.assertEqual(order.delivery_crew, self.other_driver)
+        self.assertEqual(self.open_orders(), {"delivery": 1, "driver2": 1})
+
+    def test_status_crew_changes_and_deletes_move_the_counts(self):
+        order = Order.objects.create(
+            user=self.user, total=10, date="2024-01-01", delivery_crew=self.delivery
+        )
+        order.delivery_crew = self.other_driver
+        order.save()
+        self.assertEqual(self.open_orders(), {"delivery": 0, "driver2": 1})
+
+        self.client.force_authenticate(self.other_driver)
+        url = reverse("order-detail", kwargs={"pk": order.id})
+        self.assertEqual(self.client.patch(url, {"status": 1}).status_code, 200)
+        self.assertEqual(self.open_orders(), {"delivery": 0, "driver2": 0})
+
+        order.status = False
+        order.save()
+        order.delete()
+        self.assertEqual(self.open_orders(), {"delivery": 0, "driver2": 0})
+
+    def test_group_membership_and_rebuild(self):
+        Order.objects.create(
+            user=self.user, total=10, date="2024-01-01", delivery_crew=self.delivery
+        )
+        self.delivery.groups.remove(self.delivery_group)
+        self.assertEqual(self.open_orders(), {"driver2": 0})
+        self.delivery_group.user_set.add(self.delivery)
+        self.assertEqual(self.open_orders(), {"delivery": 1, "driver2": 0})
+
+        # bulk updates skip the signals, the rebuild command recounts
+        Order.objects.update(delivery_crew=self.other_driver)
+        call_command("rebuild_delivery_workload", stdout=io.StringIO())
+        self.assertEqual(self.open_orders(), {"delivery": 0, "driver2": 1})
 
 
 class TestManagerGroupEndpoint(APITestSetupMixin, APITestCase):
@@ -275,3 +1890,17 @@ class TestManagerGroupEndpoint(APITestSetupMixin, APITestCase):
         self.client.force_authenticate(self.manager)
         resp = self.client.post(url, {"username": newmanager.username})
         self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestShippedFixtures(TestCase):
+    def test_fixtures_load(self):
+        cache.clear()
+        for fixture in ("littlelemon_auth.json", "littlelemon_api.json"):
+            call_command(
+                "loaddata",
+                settings.BASE_DIR / "fixtures" / fixture,
+                stdout=io.StringIO(),
+            )
+        self.assertEqual(Category.objects.filter(updated_at__isnull=False).count(), 3)
+        self.assertEqual(MenuItem.objects.filter(updated_at__isnull=False).count(), 4)
+        self.assertEqual(Order.objects.filter(updated_at__isnull=False).count(), 8)
@@ -20,7 +20,11 @@ urlpatterns = [
     path("menu-items/", menu_items, name="menu-item-list"),
     path("menu-items/<int:pk>/", single_item, name="menu-item-detail"),
     path("menu-items/featured/", menu_item_featured, name="featured"),
+    path("menu-items/bulk/", menu_items_bulk, name="menu-item-bulk"),
+    path("menu-items/export/", menu_items_export, name="menu-item-export"),
+    path("menu-items/cache-stats/", menu_cache_stats_view, name="menu-cache-stats"),
     path("cart-items/checkout/", checkout, name="checkout"),
+    path("cart-items/checkout/jobs/<int:pk>/", checkout_job, name="checkout-job"),
     path("", include(router.urls)),
     path("", include(router.urls)),
     # path("category/<int:pk>", views.category_detail, name="category-detail"),
@@ -35,4 +39,12 @@ urlpatterns = [
         order_detail,
         name="order-detail",
     ),
+    path("reports/revenue/", revenue_report, name="report-revenue"),
+    path("reports/top-items/", top_items_report, name="report-top-items"),
+    path("reports/crew/", crew_report, name="report-crew"),
+    path(
+        "reports/average-order-value/",
+        average_order_value_report,
+        name="report-average-order-value",
+    ),
 ]
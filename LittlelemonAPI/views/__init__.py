@@ -1,6 +1,19 @@
-from .menu import menu_items, single_item, menu_item_featured
+from .menu import (
+    menu_items,
+    menu_items_bulk,
+    menu_items_export,
+    single_item,
+    menu_item_featured,
+    menu_cache_stats_view,
+)
 from .category import CategoriesView
-from .cart import CartItemsView, OrderItemsView, checkout
+from .cart import CartItemsView, OrderItemsView, checkout, checkout_job
 from .order import order, order_detail
 from .manager import managers
+from .report import (
+    average_order_value_report,
+    crew_report,
+    revenue_report,
+    top_items_report,
+)
 from .throttle import throttle_check_auth
@@ -1,47 +1,168 @@
 from rest_framework import viewsets
-from LittlelemonAPI.models import CartItem, Order, OrderItem
-from LittlelemonAPI.serializers import CartItemSerializer, CheckoutResponseSerializer
+from LittlelemonAPI.models import CartItem, CheckoutJob
+from LittlelemonAPI.cart_store import (
+    cart_summary,
+    fold_cart_operations,
+    get_cart_backend,
+)
+from LittlelemonAPI.checkout import enqueue_checkout, place_order
+from LittlelemonAPI.idempotency import idempotent
+from LittlelemonAPI.roles import is_manager
+from LittlelemonAPI.serializers import (
+    CartItemSerializer,
+    CartOperationSerializer,
+    CartSummarySerializer,
+    CheckoutJobSerializer,
+    CheckoutResponseSerializer,
+)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from django.contrib.auth.models import User
-from LittlelemonAPI.utils import get_best_delivery_person
-import datetime
 from rest_framework.decorators import action
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
 '''
  Items for a cart or for an order are here
 '''
-class CartItemsView(viewsets.ModelViewSet):
+class CartLinesView(viewsets.GenericViewSet):
+    """
+    The lines of the user's cart, stored by the CART_BACKEND cart backend
+    (see cart_store.py) rather than always in the CartItem table.
+    """
+
     permission_classes = [IsAuthenticated]
     serializer_class = CartItemSerializer
+    queryset = CartItem.objects.none()  # for the schema, carts come from the backend
+
+    @property
+    def cart(self):
+        return get_cart_backend()
+
+    def list(self, request):
+        return Response(self.cart.items(request.user.id))
+
+    @idempotent()
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        line = self.cart.add(
+            request.user.id,
+            serializer.validated_data["menuitem"].id,
+            serializer.validated_data["quantity"],
+        )
+        return Response(line, status=status.HTTP_201_CREATED)
+
+    def _line_or_404(self, pk):
+        line = self.cart.get(self.request.user.id, pk)
+        if line is None:
+            raise Http404("No CartItem matches the given query.")
+        return line
+
+    def retrieve(self, request, pk=None):
+        return Response(self._line_or_404(pk))
+
+    def update(self, request, pk=None, partial=False):
+        line = self._line_or_404(pk)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        menuitem = serializer.validated_data.get("menuitem")
+        line = self.cart.update(
+            request.user.id,
+            pk,
+            menuitem.id if menuitem else line["menuitem"],
+            serializer.validated_data["quantity"],
+        )
+        if line is None:
+            raise Http404("No CartItem matches the given query.")
+        return Response(line)
+
+    def partial_update(self, request, pk=None):
+        return self.update(request, pk, partial=True)
+
+    def destroy(self, request, pk=None):
+        if not self.cart.remove(request.user.id, pk):
+            raise Http404("No CartItem matches the given query.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemsView(CartLinesView):
+    """
+    The user's cart: its lines plus clearing, totals and batch changes.
+    """
 
-    def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user.id)
-    
     @action(detail=False, methods=["delete"], url_path='', url_name='delete')
     def delete(self, request):
-        CartItem.objects.filter(user=request.user).delete()
+        self.cart.clear(request.user.id)
         return Response(None, status=status.HTTP_204_NO_CONTENT)
-        return Response({"detail": "Cart cleared."}, status=HTTP_STATUS_204_NO_CONTENT)
-class OrderItemsView(viewsets.ModelViewSet):
-    permission_classes = [IsAuthenticated]
-    serializer_class = CartItemSerializer
 
-    def get_queryset(self):
-        return CartItem.objects.filter(user=self.request.user.id)
-    
-   
+    @extend_schema(
+        request=None,
+        responses={200: CartSummarySerializer},
+        description=(
+            "Totals for the cart: line and item counts, subtotal, tax, total "
+            "and each line's total."
+        ),
+    )
+    @action(detail=False, methods=["get"], url_path="summary", url_name="summary")
+    def summary(self, request):
+        return Response(CartSummarySerializer(cart_summary(request.user.id)).data)
+
+    @extend_schema(
+        request=CartOperationSerializer(many=True),
+        responses={200: CartItemSerializer(many=True)},
+        description=(
+            "Apply a list of {menuitem, op, quantity} changes to the cart in "
+            "one go. op is set (default), increment or remove. A set takes a "
+            "quantity of 0 to 40 and an increment one of -40 to 40, otherwise "
+            "the whole batch is rejected. Each step keeps the line between 0 "
+            "and 40. Returns the whole cart afterwards."
+        ),
+    )
+    @action(detail=False, methods=["post"], url_path="batch", url_name="batch")
+    @idempotent()
+    def batch(self, request):
+        operations = CartOperationSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.CART_BATCH_MAX_OPERATIONS,
+        )
+        operations.is_valid(raise_exception=True)
+        self.cart.apply(
+            request.user.id, fold_cart_operations(operations.validated_data)
+        )
+        return Response(self.cart.items(request.user.id))
+
+
+class OrderItemsView(CartLinesView):
+    """
+    The same cart lines under /order-items/. Goes through the cart
+    backend too: rows written here directly would be overwritten by the
+    cache backend's next persist().
+    """
+
 
 @extend_schema(
     operation_id="api_checkout",
-    description="View to checkout the cart items and create an order.",
+    description=(
+        "View to checkout the cart items and create an order. "
+        "With ?async=true (or CHECKOUT_ASYNC on) the checkout is queued "
+        "instead: 202 with a job id to poll at /api/cart-items/checkout/jobs/<id>/."
+    ),
     request=None,
+    parameters=[OpenApiParameter("async", OpenApiTypes.BOOL)],
     responses={
         201: CheckoutResponseSerializer,
+        202: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Checkout queued, {detail, job_id, status}.",
+        ),
         400: OpenApiResponse(
             response=OpenApiTypes.OBJECT,
             description="Your cart is empty."
@@ -50,27 +171,39 @@ class OrderItemsView(viewsets.ModelViewSet):
 )
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent()
 def checkout(request):
-    user = User.objects.get(id=request.user.id)
-    cart_items = CartItem.objects.filter(user=user)
-    if not cart_items.exists():
-        return Response(
-            {"detail": "Your cart is empty."}, status=400
-        )
-    total_price = sum(item.menuitem.price * item.quantity for item in cart_items)
-    delivery_person = get_best_delivery_person(Order.objects.all())
-    order = Order.objects.create(
-        user=user,
-        total=total_price,
-        date=datetime.date.today(),
-        delivery_crew=delivery_person,
-    )
-    for item in cart_items:
-        OrderItem.objects.create(
-            order=order, menuitem=item.menuitem, quantity=item.quantity
+    run_async = request.query_params.get("async")
+    if run_async is None:
+        run_async = settings.CHECKOUT_ASYNC
+    else:
+        run_async = run_async.lower() in ("1", "true", "yes")
+    if run_async:
+        job = enqueue_checkout(request.user)
+        response = Response(
+            {"detail": "Checkout queued.", "job_id": job.id, "status": job.status},
+            status=status.HTTP_202_ACCEPTED,
         )
-    cart_items.delete()
+        response["Location"] = reverse("checkout-job", kwargs={"pk": job.id})
+        return response
+    order = place_order(request.user)
     return Response(
         {"detail": "Order created successfully.", "order_id": order.id},
         status=201,
     )
+
+
+@extend_schema(
+    operation_id="api_checkout_job",
+    description="Status of a queued checkout. Owners and managers only.",
+    request=None,
+    responses={200: CheckoutJobSerializer},
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def checkout_job(request, pk):
+    jobs = CheckoutJob.objects.all()
+    if not is_manager(request):
+        jobs = jobs.filter(user=request.user)
+    job = get_object_or_404(jobs, pk=pk)
+    return Response(CheckoutJobSerializer(job).data)
@@ -3,6 +3,8 @@ from LittlelemonAPI.models import Category
 from LittlelemonAPI.serializers import CategorySerializer
 from LittlelemonAPI.permissions import IsManagerUser
 from rest_framework.permissions import AllowAny
+from LittlelemonAPI.cache import get_menu_version
+from LittlelemonAPI.conditional import Validators
 
 class CategoriesView(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -12,3 +14,34 @@ class CategoriesView(viewsets.ModelViewSet):
         if self.request.method in ["POST", "PUT", "PATCH", "DELETE"]:
             return [IsManagerUser()]
         return [AllowAny()]
+
+    def list(self, request, *args, **kwargs):
+        # any category write bumps the menu version
+        validators = Validators(
+            request, etag_parts=("categories", get_menu_version())
+        )
+        not_modified = validators.check()
+        if not_modified is not None:
+            return not_modified
+        return validators.apply(super().list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs["pk"]
+        updated_at = None
+        if str(pk).isdigit():
+            updated_at = (
+                Category.objects.filter(pk=pk)
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)  # the usual 404
+        validators = Validators(
+            request,
+            etag_parts=("category", pk, updated_at.isoformat()),
+            last_modified=updated_at,
+        )
+        not_modified = validators.check()
+        if not_modified is not None:
+            return not_modified
+        return validators.apply(super().retrieve(request, *args, **kwargs))
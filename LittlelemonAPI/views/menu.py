@@ -1,57 +1,90 @@
 from LittlelemonAPI.views import *
-from LittlelemonAPI.serializers import MenuItemSerializer, CheckoutResponseSerializer
+from LittlelemonAPI.serializers import (
+    MenuItemSerializer,
+    CheckoutResponseSerializer,
+    FeaturedScheduleSerializer,
+    MenuItemBulkSerializer,
+    menu_item_values,
+)
 from LittlelemonAPI.models import MenuItem, Category
 from LittlelemonAPI.permissions import IsManagerUser
+from LittlelemonAPI.roles import is_manager
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from drf_spectacular.utils import extend_schema, OpenApiResponse, extend_schema_view
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.settings import api_settings
+from drf_spectacular.utils import (
+    extend_schema,
+    OpenApiParameter,
+    OpenApiResponse,
+    extend_schema_view,
+)
 from drf_spectacular.types import OpenApiTypes
+from django.conf import settings
 from django.core.paginator import Paginator, EmptyPage
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
+from LittlelemonAPI.cache import (
+    get_menu_version,
+    get_or_set_menu_page,
+    get_stock_version,
+    menu_cache_stats,
+    normalize_menu_params,
+    with_live_stock,
+)
+from LittlelemonAPI.pagination import KeysetPaginator, get_page_size
+from LittlelemonAPI.search import search_menu_items
+from LittlelemonAPI.ordering import resolve_ordering
+from LittlelemonAPI.conditional import Validators
+from LittlelemonAPI.export import EXPORT_FORMATS, EXPORT_RENDERERS, export_lines
+from LittlelemonAPI.featured import (
+    get_featured_item_data,
+    schedule_featured_item,
+    set_featured_item,
+)
+from django.utils import timezone
 
 @extend_schema(
     methods=["GET", "POST"],
     request=MenuItemSerializer,
     responses={200: MenuItemSerializer(many=True), 201: MenuItemSerializer},
-    description="List or create menu items. POST is manager-only.",
+    description=(
+        "List or create menu items. POST is manager-only. "
+        "Pass ?cursor= to switch to cursor pagination: the response becomes "
+        "{next, previous, results} and next/previous are cursors to pass back."
+    ),
     tags=["Menu Items"],
 )
 @api_view(["GET", "POST"])
 def menu_items(request):
     # Only allow POST method for manager users
     user = request.user
-    if request.method != "GET" and not user.groups.filter(name="manager").exists():
+    if request.method != "GET" and not is_manager(request):
         if not request.user.is_authenticated:
             return Response({"detail": "No jwt token."}, status=status.HTTP_401_UNAUTHORIZED) 
         return Response({"detail": "managers only."}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == "GET":
-        items = MenuItem.objects.select_related("category").all()
-        category_name = request.query_params.get("category")
-        to_price = request.query_params.get("to_price")
-        search = request.query_params.get("search")
-        ordering = request.query_params.get("ordering")
-        perpage = request.query_params.get("perpage", default=2)
-        page = request.query_params.get("page", default=1)
-        if category_name:
-            items = items.filter(category__title=category_name)
-        if to_price:
-            items = items.filter(price__lte=to_price)
-        if search:
-            items = items.filter(title__icontains=search)
-        if ordering:
-            ordering_fields = ordering.split(",")
-            items = items.order_by(*ordering_fields)
-
-        paginator = Paginator(items, per_page=perpage)
-        try:
-            items = paginator.page(page)
-        except EmptyPage:
-            items = []
-        serialized_items = MenuItemSerializer(items, many=True)
-        return Response(serialized_items.data)
+        params = normalize_menu_params(request.query_params)
+        version = get_menu_version()
+        # read before the page: a checkout in between only costs a 200
+        validators = Validators(
+            request,
+            etag_parts=("menu-items", version, get_stock_version(), params),
+        )
+        not_modified = validators.check()
+        if not_modified is not None:
+            return not_modified
+        data = get_or_set_menu_page(
+            params, lambda: _menu_items_page(request), version=version
+        )
+        # cached pages aren't dropped by checkout, the stock comes on top
+        if isinstance(data, dict):  # cursor mode
+            data = {**data, "results": with_live_stock(data["results"], version)}
+        else:
+            data = with_live_stock(data, version)
+        return validators.apply(Response(data))
 
     elif request.method == "POST":
         serialized_item = MenuItemSerializer(data=request.data)
@@ -59,6 +92,151 @@ def menu_items(request):
         serialized_item.save()
         return Response(serialized_item.data, status=status.HTTP_201_CREATED)
 
+def _filter_menu_items(query_params, rank=True):
+    """
+    Apply the menu_items filters (category, to_price, search). Returns the
+    queryset and whether it is already ordered by search rank, which is
+    only done when the client didn't ask for an ordering.
+    """
+    items = MenuItem.objects.all()
+    category_name = query_params.get("category")
+    to_price = query_params.get("to_price")
+    search = query_params.get("search")
+    if category_name:
+        items = items.filter(category__title=category_name)
+    if to_price:
+        items = items.filter(price__lte=to_price)
+    ranked = bool(search) and rank and not query_params.get("ordering")
+    if search:
+        items = search_menu_items(items, search, rank=ranked)
+    return items, ranked
+
+
+def _menu_items_page(request):
+    """
+    Run the filtered menu query for one page and serialize it.
+    """
+    ordering_fields = resolve_ordering(request.query_params.get("ordering"))
+    page = request.query_params.get("page", default=1)
+    perpage = get_page_size(request.query_params)
+    cursor_mode = "cursor" in request.query_params
+    items, ranked = _filter_menu_items(request.query_params, rank=not cursor_mode)
+
+    if cursor_mode:
+        # keyset mode: no COUNT, no OFFSET. ?cursor= (empty) is the first page
+        paginator = KeysetPaginator(ordering_fields, page_size=perpage)
+        keys = [field.lstrip("-") for field in paginator.ordering]
+        rows = menu_item_values.values(items, *keys)
+        keyset_page = paginator.paginate(rows, request.query_params.get("cursor"))
+        return keyset_page.as_dict(menu_item_values.serialize(keyset_page.rows))
+
+    if not ranked:
+        items = items.order_by(*ordering_fields)
+    paginator = Paginator(menu_item_values.values(items), per_page=perpage)
+    try:
+        rows = paginator.page(page)
+    except EmptyPage:
+        rows = []
+    return menu_item_values.serialize(rows)
+
+
+@extend_schema(
+    methods=["GET"],
+    request=None,
+    responses={200: OpenApiTypes.OBJECT},
+    description="Hit/miss counters for the menu page cache. Manager only.",
+    tags=["Menu Items"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+def menu_cache_stats_view(request):
+    return Response(menu_cache_stats())
+
+
+@extend_schema(
+    methods=["GET"],
+    request=None,
+    parameters=[
+        OpenApiParameter("output", enum=list(EXPORT_FORMATS), default="jsonl"),
+        OpenApiParameter("category"),
+        OpenApiParameter("to_price"),
+        OpenApiParameter("search"),
+        OpenApiParameter("ordering"),
+    ],
+    responses={
+        (200, "application/x-ndjson"): OpenApiTypes.STR,
+        (200, "text/csv"): OpenApiTypes.STR,
+    },
+    description=(
+        "Stream the whole menu, one item per line, as JSON Lines "
+        "(?output=jsonl, the default) or CSV (?output=csv, or Accept: "
+        "text/csv). Takes the same "
+        "filters and ordering as the menu item list. Manager only."
+    ),
+    tags=["Menu Items"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, *EXPORT_RENDERERS])
+def menu_items_export(request):
+    # without ?output=, an Accept of text/csv or application/x-ndjson picks it
+    accepted = request.accepted_renderer.format
+    output = request.query_params.get(
+        "output", accepted if accepted in EXPORT_FORMATS else "jsonl"
+    )
+    if output not in EXPORT_FORMATS:
+        return Response(
+            {"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    ordering_fields = resolve_ordering(request.query_params.get("ordering"))
+    items, ranked = _filter_menu_items(request.query_params)
+    if not ranked:
+        items = items.order_by(*ordering_fields)
+    response = StreamingHttpResponse(
+        export_lines(
+            menu_item_values,
+            items,
+            output,
+            chunk_size=settings.MENU_EXPORT_CHUNK_SIZE,
+        ),
+        content_type=EXPORT_FORMATS[output],
+    )
+    response["Content-Disposition"] = f'attachment; filename="menu.{output}"'
+    return response
+
+
+@extend_schema(
+    methods=["POST"],
+    request=MenuItemSerializer(many=True),
+    responses={200: OpenApiTypes.OBJECT, 201: OpenApiTypes.OBJECT},
+    description=(
+        "Create many menu items in one transaction. Manager only. "
+        "With ?upsert=true items whose title already exists are updated. "
+        "Returns {id, title, status} per item, in request order."
+    ),
+    tags=["Menu Items"],
+)
+@api_view(["POST"])
+@permission_classes([IsManagerUser])
+def menu_items_bulk(request):
+    upsert = request.query_params.get("upsert", "").lower() in ("1", "true", "yes")
+    serialized_items = MenuItemBulkSerializer(
+        data=request.data,
+        many=True,
+        allow_empty=False,
+        max_length=settings.MENU_BULK_MAX_ITEMS,
+        context={"upsert": upsert},
+    )
+    serialized_items.is_valid(raise_exception=True)
+    serialized_items.save()
+    results = serialized_items.results
+    created = any(result["status"] == "created" for result in results)
+    return Response(
+        results, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    )
+
+
 @extend_schema(
     methods=["GET", "PUT", "PATCH", "DELETE"],
     request=MenuItemSerializer,
@@ -72,9 +250,26 @@ def single_item(request, pk):
         return Response({"detail": "Admin only."}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == "GET":
-        item = get_object_or_404(MenuItem, pk=pk)
+        # the body depends on the item and its category, nothing else
+        stamps = (
+            MenuItem.objects.filter(pk=pk)
+            .values_list("updated_at", "category__updated_at")
+            .first()
+        )
+        if stamps is None:
+            raise Http404("No MenuItem matches the given query.")
+        last_modified = max(stamps)
+        validators = Validators(
+            request,
+            etag_parts=("menu-item", pk, last_modified.isoformat()),
+            last_modified=last_modified,
+        )
+        not_modified = validators.check()
+        if not_modified is not None:
+            return not_modified
+        item = get_object_or_404(MenuItem.objects.select_related("category"), pk=pk)
         serialized_item = MenuItemSerializer(item)
-        return Response(serialized_item.data)
+        return validators.apply(Response(serialized_item.data))
     elif request.method == "PUT":
         item = get_object_or_404(MenuItem, pk=pk)
         serialized_item = MenuItemSerializer(item, data=request.data)
@@ -97,29 +292,31 @@ def single_item(request, pk):
     request=MenuItemSerializer,
     responses={
         200: MenuItemSerializer,
+        201: FeaturedScheduleSerializer,
         404: OpenApiResponse(description="No special item for today."),
         403: OpenApiResponse(description="Admin only."),
         400: OpenApiResponse(description="Item ID is required."),
     },
-    description="view/update featured menu item.",
+    description=(
+        "view/update featured menu item. POST with a future `starts_at` "
+        "schedules the switch instead of making it now."
+    ),
 )
 @api_view(["GET", "POST"])
 def menu_item_featured(request):
     """
     View to get the menu item of the day or
-    to set it via POST.
+    to set (or schedule) it via POST.
     """
 
     if request.method == "GET":
-        try:
-            item = MenuItem.objects.get(featured=True)
-            serialized_item = MenuItemSerializer(item)
-            return Response(serialized_item.data)
-        except MenuItem.DoesNotExist:
+        data = get_featured_item_data()
+        if data is None:
             return Response(
                 {"detail": "No special item for today."},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        return Response(data)
     elif request.method == "POST":
         if not request.user.is_staff:
             return Response({"detail": "Admin only."}, status=status.HTTP_403_FORBIDDEN)
@@ -130,12 +327,21 @@ def menu_item_featured(request):
             )
         try:
             item = MenuItem.objects.get(pk=item_id)
-            MenuItem.objects.update(featured=False)  # reset previous featured item
-            item.featured = True
-            item.save()
-            serialized_item = MenuItemSerializer(item)
-            return Response(serialized_item.data, status=status.HTTP_200_OK)
         except MenuItem.DoesNotExist:
             return Response(
                 {"detail": "Menu item not found."}, status=status.HTTP_404_NOT_FOUND
             )
+        starts_at = request.data.get("starts_at")
+        if starts_at:
+            schedule = FeaturedScheduleSerializer(
+                data={"menuitem": item.id, "starts_at": starts_at}
+            )
+            schedule.is_valid(raise_exception=True)
+            if schedule.validated_data["starts_at"] > timezone.now():
+                schedule = FeaturedScheduleSerializer(
+                    schedule_featured_item(item, schedule.validated_data["starts_at"])
+                )
+                return Response(schedule.data, status=status.HTTP_201_CREATED)
+        set_featured_item(item)
+        serialized_item = MenuItemSerializer(item)
+        return Response(serialized_item.data, status=status.HTTP_200_OK)
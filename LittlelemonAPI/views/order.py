@@ -1,71 +1,202 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from rest_framework.utils.urls import replace_query_param
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from LittlelemonAPI.serializers import OrderSerializer
-from LittlelemonAPI.models import Order
+from LittlelemonAPI.serializers import (
+    OrderDetailSerializer,
+    OrderFilterSerializer,
+    OrderSerializer,
+    order_line_values,
+    order_values,
+)
+from LittlelemonAPI.models import Order, OrderItem
+from django.conf import settings
+from django.db.models import Max, Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from LittlelemonAPI.conditional import Validators
+from LittlelemonAPI.idempotency import idempotent
+from LittlelemonAPI.pagination import KeysetPaginator, get_page_size
+from LittlelemonAPI.roles import is_delivery, is_manager
+
+# newest first; unique, and matches the (..., date, id) indexes
+ORDER_LIST_ORDERING = ["-date", "-id"]
+
 
 @extend_schema(
     operation_id="api_order_list",
-    description="View to see orders. Managers see all, users see their own orders and delivery crew see orders assigned to them.",
-    responses={200: OrderSerializer(many=True)},
+    description=(
+        "View to see orders with their lines. Managers see all, users see "
+        "their own orders and delivery crew see orders assigned to them. "
+        "Newest first, at most perpage (capped at MAX_PAGE_SIZE) orders. When "
+        "there are more, a Link: <...>; rel=\"next\" header points to the next "
+        "page. Pass ?cursor= for cursor pagination: the response becomes "
+        "{next, previous, results} and next/previous are cursors to pass back."
+    ),
+    parameters=[
+        OpenApiParameter("status", OpenApiTypes.BOOL),
+        OpenApiParameter("date_from", OpenApiTypes.DATE),
+        OpenApiParameter("date_to", OpenApiTypes.DATE),
+        OpenApiParameter("delivery_crew", OpenApiTypes.INT),
+        OpenApiParameter("perpage", OpenApiTypes.INT),
+        OpenApiParameter("cursor"),
+    ],
+    responses={200: OrderDetailSerializer(many=True)},
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def order(request):
     user = request.user
     if request.method == "GET":
-        if user.groups.filter(name="manager").exists():
+        if is_manager(request):
             orders = Order.objects.all()
-        elif user.groups.filter(name="delivery").exists():
+        elif is_delivery(request):
             orders = Order.objects.filter(delivery_crew=user)
         else:
             orders = Order.objects.filter(user=user)
-        serialized_order = OrderSerializer(orders, many=True)
-        return Response(serialized_order.data)
+        orders = _filter_orders(orders, request.query_params)
+        perpage = get_page_size(request.query_params, default=settings.MAX_PAGE_SIZE)
+        rows = order_values.values(orders, "date", "id")
+        paginator = KeysetPaginator(ORDER_LIST_ORDERING, page_size=perpage)
+        page = paginator.paginate(rows, request.query_params.get("cursor"))
+        results = _with_lines(order_values.serialize(page.rows))
+        if "cursor" in request.query_params:
+            return Response(page.as_dict(results))
+        # plain list: only the first page, point to the rest like the envelope would
+        response = Response(results)
+        if page.next_cursor:
+            url = replace_query_param(
+                request.build_absolute_uri(), "cursor", page.next_cursor
+            )
+            response["Link"] = f'<{url}>; rel="next"'
+        return response
+
+
+def _order_lines() -> Prefetch:
+    """
+    An order's lines with their menu item titles, in one query for any
+    number of orders.
+    """
+    lines = (
+        OrderItem.objects.select_related("menuitem")
+        .only("order", "menuitem__title", "quantity", "unit_price", "line_total")
+        .order_by("id")
+    )
+    return Prefetch("orderitem_set", queryset=lines, to_attr="lines")
+
+
+def _with_lines(orders: list) -> list:
+    """
+    Add each serialized order's lines, the `.values()` counterpart of
+    prefetching _order_lines(): one query for the whole page.
+    """
+    by_id = {}
+    for order in orders:
+        order["items"] = []
+        by_id[order["id"]] = order
+    rows = list(
+        order_line_values.values(
+            OrderItem.objects.filter(order_id__in=by_id).order_by("id"), "order"
+        )
+    )
+    for row, line in zip(rows, order_line_values.serialize(rows)):
+        by_id[row["order"]]["items"].append(line)
+    return orders
+
+
+def _filter_orders(orders, query_params):
+    filters = OrderFilterSerializer(data=query_params)
+    filters.is_valid(raise_exception=True)
+    params = filters.validated_data
+    if params["status"] is not None:
+        orders = orders.filter(status=params["status"])
+    if "date_from" in params:
+        orders = orders.filter(date__gte=params["date_from"])
+    if "date_to" in params:
+        orders = orders.filter(date__lte=params["date_to"])
+    if "delivery_crew" in params:
+        orders = orders.filter(delivery_crew_id=params["delivery_crew"])
+    return orders
+
 
 @extend_schema(
     operation_id="api_order_details_get",
-    description="Retrieve a specific order.",
+    description="Retrieve a specific order with its lines.",
     request=None,
-    responses={200: OrderSerializer, 403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden")},
-    methods=["GET"]
+    responses={
+        200: OrderDetailSerializer,
+        403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden"),
+    },
+    methods=["GET"],
 )
 @extend_schema(
     operation_id="api_order_details_patch",
     description="Update a specific order.",
     request=None,
-    responses={200: OrderSerializer, 403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden")},
-    methods=["PATCH"]
+    responses={
+        200: OrderSerializer,
+        403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden"),
+    },
+    methods=["PATCH"],
 )
 @extend_schema(
     operation_id="api_order_details_delete",
     description="Delete a specific order.",
     request=None,
-    responses={204: OpenApiResponse(description="Order deleted."), 403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden")},
-    methods=["DELETE"]
+    responses={
+        204: OpenApiResponse(description="Order deleted."),
+        403: OpenApiResponse(response=OpenApiTypes.OBJECT, description="Forbidden"),
+    },
+    methods=["DELETE"],
 )
 @api_view(["GET", "DELETE", "PATCH"])
 @permission_classes([IsAuthenticated])
+@idempotent(methods=("PATCH",))
 def order_detail(request, pk):
     user = request.user
     if request.method == "GET":
-        order = get_object_or_404(Order, pk=pk)
-        if user.groups.filter(name="manager").exists() or order.user == user:
-            serialized_order = OrderSerializer(order)
-            return Response(serialized_order.data)
-        else:
-            return Response({"detail": "You do not have permission to view this order."}, status=403)
+        # check access and freshness off the header row before loading the order
+        # the lines show menu item titles, so a menu item change is a change too
+        header = (
+            Order.objects.filter(pk=pk)
+            .annotate(lines_updated_at=Max("orderitem__menuitem__updated_at"))
+            .values("user_id", "updated_at", "lines_updated_at")
+            .first()
+        )
+        if header is None:
+            raise Http404("No Order matches the given query.")
+        if not is_manager(request) and header["user_id"] != user.id:
+            return Response(
+                {"detail": "You do not have permission to view this order."},
+                status=403,
+            )
+        changed = max(filter(None, [header["updated_at"], header["lines_updated_at"]]))
+        validators = Validators(
+            request,
+            etag_parts=(
+                "order",
+                pk,
+                header["updated_at"].isoformat(),
+                changed.isoformat(),
+            ),
+            last_modified=changed,
+        )
+        not_modified = validators.check()
+        if not_modified is not None:
+            return not_modified
+        order = get_object_or_404(Order.objects.prefetch_related(_order_lines()), pk=pk)
+        serialized_order = OrderDetailSerializer(order)
+        return validators.apply(Response(serialized_order.data))
     elif request.method == "DELETE":
-        if not user.groups.filter(name="manager").exists():
+        if not is_manager(request):
             return Response({"detail": "You do not have permission to delete orders."}, status=403)
         order = get_object_or_404(Order, pk=pk, user=request.user)
         order.delete()
         return Response(status=204)
     elif request.method == "PATCH":
-        if not user.groups.filter(name="manager").exists() and not user.groups.filter(name="delivery").exists():
+        if not is_manager(request) and not is_delivery(request):
             return Response({"detail": "You do not have permission to edit orders."}, status=403)
         order = get_object_or_404(Order, pk=pk)
         serialized_order = OrderSerializer(
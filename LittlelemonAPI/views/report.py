@@ -0,0 +1,136 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from LittlelemonAPI.permissions import IsManagerUser
+from LittlelemonAPI.reports import (
+    average_order_value,
+    get_or_set_report,
+    orders_per_crew,
+    revenue_by_period,
+    top_menu_items,
+)
+from LittlelemonAPI.serializers import (
+    AverageOrderValueSerializer,
+    CrewRowSerializer,
+    ReportRangeSerializer,
+    RevenueReportParamsSerializer,
+    RevenueRowSerializer,
+    TopItemRowSerializer,
+    TopItemsReportParamsSerializer,
+)
+
+RANGE_PARAMETERS = [
+    OpenApiParameter(
+        "date_from", OpenApiTypes.DATE, description="Default: 29 days before date_to."
+    ),
+    OpenApiParameter("date_to", OpenApiTypes.DATE, description="Default: today."),
+]
+
+
+def _report(request, name, params_serializer, build):
+    """
+    Validate the query params, then return {date_from, date_to, results}
+    with `build(params)` as results, cached per report and params.
+    """
+    params = params_serializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    params = params.validated_data
+    results = get_or_set_report(name, params, lambda: build(params))
+    return Response(
+        {
+            "date_from": params["date_from"],
+            "date_to": params["date_to"],
+            "results": results,
+        }
+    )
+
+
+@extend_schema(
+    operation_id="api_report_revenue",
+    description="Orders and revenue per day or week in a date range. Manager only.",
+    parameters=[
+        *RANGE_PARAMETERS,
+        OpenApiParameter("period", enum=["day", "week"], default="day"),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+    tags=["Reports"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+def revenue_report(request):
+    return _report(
+        request,
+        "revenue",
+        RevenueReportParamsSerializer,
+        lambda p: RevenueRowSerializer(
+            revenue_by_period(p["date_from"], p["date_to"], p["period"]), many=True
+        ).data,
+    )
+
+
+@extend_schema(
+    operation_id="api_report_top_items",
+    description="Best selling menu items by quantity in a date range. Manager only.",
+    parameters=[
+        *RANGE_PARAMETERS,
+        OpenApiParameter("limit", OpenApiTypes.INT, default=10),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+    tags=["Reports"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+def top_items_report(request):
+    return _report(
+        request,
+        "top-items",
+        TopItemsReportParamsSerializer,
+        lambda p: TopItemRowSerializer(
+            top_menu_items(p["date_from"], p["date_to"], p["limit"]), many=True
+        ).data,
+    )
+
+
+@extend_schema(
+    operation_id="api_report_crew",
+    description="Orders per delivery crew member in a date range. Manager only.",
+    parameters=RANGE_PARAMETERS,
+    responses={200: OpenApiTypes.OBJECT},
+    tags=["Reports"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+def crew_report(request):
+    return _report(
+        request,
+        "crew",
+        ReportRangeSerializer,
+        lambda p: CrewRowSerializer(
+            orders_per_crew(p["date_from"], p["date_to"]), many=True
+        ).data,
+    )
+
+
+@extend_schema(
+    operation_id="api_report_average_order_value",
+    description=(
+        "Order count, revenue and average order value in a date range. "
+        "Manager only."
+    ),
+    parameters=RANGE_PARAMETERS,
+    responses={200: OpenApiTypes.OBJECT},
+    tags=["Reports"],
+)
+@api_view(["GET"])
+@permission_classes([IsManagerUser])
+def average_order_value_report(request):
+    return _report(
+        request,
+        "average-order-value",
+        ReportRangeSerializer,
+        lambda p: AverageOrderValueSerializer(
+            average_order_value(p["date_from"], p["date_to"])
+        ).data,
+    )
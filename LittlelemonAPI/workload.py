@@ -0,0 +1,112 @@
+"""
+Open orders per delivery crew member.
+
+DeliveryWorkload has one row per user in the "delivery" group holding
+how many undelivered orders are assigned to them. signals.py keeps it
+in step with Order saves/deletes and group changes, so checkout picks
+the least loaded driver with one indexed query instead of looking at
+every order ever placed.
+
+Queryset .update()/.delete() on orders skip the signals; run
+`manage.py rebuild_delivery_workload` after bulk changes like that.
+"""
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import Count, F
+
+from LittlelemonAPI.models import DeliveryWorkload, Order
+from LittlelemonAPI.roles import DELIVERY as DELIVERY_GROUP
+
+
+def least_loaded_crew():
+    """
+    The delivery crew member with the fewest open orders (lowest id on a
+    tie), or None when there is no delivery crew.
+    """
+    workload = (
+        DeliveryWorkload.objects.select_related("crew")
+        .order_by("open_orders", "crew_id")
+        .first()
+    )
+    return workload.crew if workload else None
+
+
+def open_crew_id(crew_id, delivered) -> int | None:
+    """
+    The crew an order counts against: its crew while it is undelivered.
+    """
+    return None if delivered else crew_id
+
+
+def move_open_order(old_crew_id, new_crew_id) -> None:
+    """
+    An open order moved from one crew (or none) to another (or none).
+    """
+    if old_crew_id == new_crew_id:
+        return
+    if old_crew_id is not None:
+        DeliveryWorkload.objects.filter(crew_id=old_crew_id, open_orders__gt=0).update(
+            open_orders=F("open_orders") - 1
+        )
+    if new_crew_id is not None:
+        DeliveryWorkload.objects.filter(crew_id=new_crew_id).update(
+            open_orders=F("open_orders") + 1
+        )
+
+
+def count_open_orders(crew_ids) -> dict:
+    return dict(
+        Order.objects.filter(status=False, delivery_crew_id__in=crew_ids)
+        .values("delivery_crew_id")
+        .annotate(n=Count("id"))
+        .values_list("delivery_crew_id", "n")
+    )
+
+
+def add_crew(user_ids) -> None:
+    """
+    Start tracking users who joined the delivery group.
+    """
+    counts = count_open_orders(user_ids)
+    DeliveryWorkload.objects.bulk_create(
+        [DeliveryWorkload(crew_id=i, open_orders=counts.get(i, 0)) for i in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_crew(user_ids=None) -> None:
+    """
+    Stop tracking users who left the delivery group (everyone if None).
+    """
+    workloads = DeliveryWorkload.objects.all()
+    if user_ids is not None:
+        workloads = workloads.filter(crew_id__in=user_ids)
+    workloads.delete()
+
+
+def is_delivery_group(group_ids) -> bool:
+    return Group.objects.filter(id__in=group_ids, name=DELIVERY_GROUP).exists()
+
+
+def rebuild_workloads() -> int:
+    """
+    Recount every delivery crew member's open orders from the order
+    table (one GROUP BY). Returns the number of crew rows written.
+    """
+    crew_ids = list(
+        User.objects.filter(groups__name=DELIVERY_GROUP).values_list("id", flat=True)
+    )
+    with transaction.atomic():
+        counts = count_open_orders(crew_ids)
+        DeliveryWorkload.objects.exclude(crew_id__in=crew_ids).delete()
+        DeliveryWorkload.objects.bulk_create(
+            [
+                DeliveryWorkload(crew_id=i, open_orders=counts.get(i, 0))
+                for i in crew_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["crew"],
+            update_fields=["open_orders"],
+        )
+    return len(crew_ids)
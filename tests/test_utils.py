@@ -16,18 +16,18 @@ class TestUtilsFunctions(unittest.TestCase):
 class TestDjangoUtilsFunctions(TestCase):
     def test_get_best_delivery_person(self):
         from LittlelemonAPI.utils import get_best_delivery_person
-        from django.contrib.auth.models import User
-        from unittest.mock import patch, MagicMock
+        from LittlelemonAPI.models import Order
+        from django.contrib.auth.models import Group, User
 
-        # Mock the User model and its filter method
-        mock_user = MagicMock(spec=User)
-        mock_user.id = 1
-        mock_user.groups.all.return_value = ["delivery"]
+        self.assertIsNone(get_best_delivery_person())
 
-        with patch("LittlelemonAPI.utils.User.objects.filter") as mock_filter:
-            mock_filter.return_value.prefetch_related.return_value = [mock_user]
+        delivery = Group.objects.create(name="delivery")
+        busy = User.objects.create(username="busy")
+        free = User.objects.create(username="free")
+        delivery.user_set.add(busy, free)
+        customer = User.objects.create(username="customer")
+        Order.objects.create(
+            user=customer, total=10, date="2024-01-01", delivery_crew=busy
+        )
 
-            orders = [MagicMock(user=mock_user)]
-            best_delivery_person = get_best_delivery_person(orders)
-
-            self.assertEqual(best_delivery_person, mock_user)
+        self.assertEqual(get_best_delivery_person(), free)